@@ -0,0 +1,157 @@
+import math
+import threading
+import time
+
+from flask import current_app, g, request
+
+from api.metrics import shed_requests
+
+# The weight of each request's latency in a route's moving average
+LATENCY_SMOOTHING = 0.2
+
+
+class RouteLimiter(object):
+    """
+    The concurrency limit of one route and the queue of requests waiting for it. The limit grows by one each time
+    a limit's worth of requests finish under the latency target while it's in use, and is cut by the backoff factor
+    when a request finishes over it, at most once per window: requests admitted before the last cut don't cut it again
+    """
+
+    def __init__(self, limit, min_limit, max_limit, queue_size, latency_target, backoff):
+        self.limit = float(limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.queue_size = queue_size
+        self.latency_target = latency_target
+        self.backoff = backoff
+        self.active = 0
+        self.waiting = 0
+        self.latency = 0.0
+        self.decreased_at = float('-inf')
+        self._condition = threading.Condition()
+
+    def _has_room(self):
+        return self.active < int(self.limit)
+
+    def acquire(self, timeout):
+        """
+        :param timeout: The number of seconds to wait in the queue for room under the limit
+        :return: True once the request is admitted, False if the queue is full or the wait timed out
+        """
+        with self._condition:
+            if not self._has_room():
+                if self.waiting >= self.queue_size:
+                    return False
+                self.waiting += 1
+                try:
+                    if not self._condition.wait_for(self._has_room, timeout):
+                        return False
+                finally:
+                    self.waiting -= 1
+            self.active += 1
+            return True
+
+    def release(self, start):
+        """
+        :param start: The time.perf_counter() the request was admitted at
+        """
+        now = time.perf_counter()
+        latency = now - start
+        with self._condition:
+            in_use = self.active >= self.limit / 2
+            self.active -= 1
+            self.latency += LATENCY_SMOOTHING * (latency - self.latency) if self.latency else latency
+            if latency > self.latency_target:
+                if start >= self.decreased_at:
+                    self.limit = max(self.min_limit, self.limit * self.backoff)
+                    self.decreased_at = now
+            elif in_use:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            # The limit may have grown by more than the one place this request frees
+            self._condition.notify_all()
+
+    def retry_after(self):
+        """
+        :return: The whole number of seconds until the queue is likely to have drained, at least one
+        """
+        with self._condition:
+            return max(1, math.ceil(self.latency * (self.waiting + 1) / int(self.limit)))
+
+    def stats(self):
+        with self._condition:
+            return {"limit": int(self.limit), "active": self.active, "waiting": self.waiting,
+                    "latency": self.latency}
+
+
+class AdmissionController(object):
+    """
+    A RouteLimiter for each endpoint, made with the settings of ADMISSION_ROUTES over the defaults on its first request
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.limiters = {}
+
+    def reset(self):
+        with self._lock:
+            self.limiters = {}
+
+    def limiter(self, endpoint):
+        with self._lock:
+            if endpoint not in self.limiters:
+                config = current_app.config
+                settings = {
+                    "limit": config['ADMISSION_INITIAL_LIMIT'],
+                    "min_limit": config['ADMISSION_MIN_LIMIT'],
+                    "max_limit": config['ADMISSION_MAX_LIMIT'],
+                    "queue_size": config['ADMISSION_QUEUE_SIZE'],
+                    "latency_target": config['ADMISSION_LATENCY_TARGET'],
+                    "backoff": config['ADMISSION_BACKOFF'],
+                    **config['ADMISSION_ROUTES'].get(endpoint, {})
+                }
+                self.limiters[endpoint] = RouteLimiter(**settings)
+            return self.limiters[endpoint]
+
+    def stats(self):
+        with self._lock:
+            limiters = dict(self.limiters)
+        return {endpoint: limiter.stats() for endpoint, limiter in sorted(limiters.items())}
+
+
+admission_controller = AdmissionController()
+
+
+def init_app(app):
+    admission_controller.reset()
+
+
+def admit_request():
+    """
+    Waits for room under the limit of the request's route, or answers with a 503 when its queue is full
+    or the wait times out
+    """
+    # The sub-requests of a batch run in the place of the batch request
+    if not current_app.config['ADMISSION_ENABLED'] or request.endpoint is None or 'admission' in g:
+        return None
+
+    limiter = admission_controller.limiter(request.endpoint)
+    if not limiter.acquire(current_app.config['ADMISSION_QUEUE_TIMEOUT']):
+        shed_requests.inc(request.endpoint)
+        return {
+            "error": "Service Unavailable",
+            "message": "The server is handling too many of these requests, try again later",
+            "error_type": "overloaded_error"
+        }, 503, {"Retry-After": str(limiter.retry_after())}
+
+    g.admission = limiter, time.perf_counter(), request.environ
+    return None
+
+
+def release_request(error=None):
+    # Runs at teardown, so a streamed response holds its place until it has been sent.
+    # The sub-requests of a batch see the batch's admission in g, only the batch request releases it
+    admission = g.get('admission')
+    if admission is None or admission[2] is not request.environ:
+        return
+    limiter, start, _ = g.pop('admission')
+    limiter.release(start)
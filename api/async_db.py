@@ -0,0 +1,53 @@
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+try:
+    from quart import current_app, g
+except ImportError:
+    current_app = g = None
+
+# The async driver used for each database when ASYNC_DATABASE_URI isn't set
+ASYNC_DRIVERS = {
+    'mysql': 'mysql+aiomysql',
+    'postgresql': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite'
+}
+
+
+def async_url(uri):
+    """
+    :param uri: The database URI of the sync app
+    :return: The same database with the async driver for its backend
+    """
+    url = make_url(uri)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername))
+
+
+def init_app(app):
+    """
+    Creates the async engine of the async app, with the same pool settings as the sync one
+    """
+    uri = app.config.get('ASYNC_DATABASE_URI') or async_url(app.config['SQLALCHEMY_DATABASE_URI'])
+    # Async engines need the async adapted pool, so a sync pool class isn't carried over
+    options = {key: value for key, value in app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}).items()
+               if key != 'poolclass'}
+    engine = create_async_engine(uri, **options)
+    app.extensions['async_sessions'] = async_sessionmaker(engine, expire_on_commit=False)
+
+    app.teardown_appcontext(close_session)
+    app.after_serving(engine.dispose)
+
+
+def session():
+    """
+    :return: The async session of the current request, opened on first use
+    """
+    if 'async_session' not in g:
+        g.async_session = current_app.extensions['async_sessions']()
+    return g.async_session
+
+
+async def close_session(error=None):
+    async_session = g.pop('async_session', None)
+    if async_session is not None:
+        await async_session.close()
@@ -0,0 +1,93 @@
+import time
+from collections import OrderedDict
+from threading import Lock
+
+
+class LRUCache(object):
+    """
+    A thread safe least recently used cache, with optional expiry of entries after ttl seconds
+    and an optional memory budget in bytes
+    """
+
+    def __init__(self, max_entries=1024, ttl=None, max_bytes=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def configure(self, max_entries, ttl=None, max_bytes=None):
+        """
+        :param max_entries: The maximum number of entries to hold before evicting the least recently used
+        :param ttl: The number of seconds an entry lives for, or None to never expire entries
+        :param max_bytes: The maximum total size of the entries, or None for no memory budget
+        """
+        with self._lock:
+            self.max_entries = max_entries
+            self.ttl = ttl
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def get(self, key, default=None):
+        """
+        :param key: The key of the entry
+        :param default: The value returned if the entry doesn't exist or has expired
+        :return: The value of the entry
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            value, expires, size = entry
+            if expires is not None and expires < time.monotonic():
+                self._remove(key)
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, size=0):
+        """
+        :param key: The key of the entry
+        :param value: The value to store
+        :param size: The size of the value in bytes, counted against the memory budget
+        """
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, expires, size)
+            self.size += size
+            self._evict()
+
+    def discard(self, predicate):
+        """
+        :param predicate: A function taking a key, entries whose key it returns True for are removed
+        """
+        with self._lock:
+            for key in [key for key in self._entries if predicate(key)]:
+                self._remove(key)
+
+    def pop(self, key):
+        """
+        :param key: The key of the entry to remove if it exists
+        """
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remove(self, key):
+        self.size -= self._entries.pop(key)[2]
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.max_entries
+                                 or (self.max_bytes is not None and self.size > self.max_bytes)):
+            self._remove(next(iter(self._entries)))
@@ -0,0 +1,98 @@
+import threading
+
+from flask import current_app, g, request
+
+from api.metrics import coalesced_requests, coalesce_timeouts
+from api.response_cache import cache_key
+
+# Set on responses to writes, a client sending it back bypasses coalescing so it never shares a response
+# computed before its own write committed
+WRITE_COOKIE = 'recent_write'
+
+# Headers of the leader's response that aren't shared with the requests waiting on it
+UNSHARED_HEADERS = {'set-cookie'}
+
+WRITE_METHODS = {'POST', 'PUT', 'PATCH', 'DELETE'}
+
+# Endpoints taking a write method that only read, the batch route runs GET sub-requests
+READ_ONLY_ENDPOINTS = {'api.batch.run_batch'}
+
+
+class Flight(object):
+    """
+    A GET request in flight, identical requests wait on it and share its response
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+
+
+# Flights by the normalized path and args of their request
+flights = {}
+flights_lock = threading.Lock()
+
+
+def coalescing():
+    return (request.method == 'GET' and current_app.config['COALESCE_ENABLED']
+            and WRITE_COOKIE not in request.cookies)
+
+
+def join_flight():
+    """
+    Makes the request the leader of a new flight, or waits on the flight of an identical request and answers
+    with its response
+    """
+    if not coalescing():
+        return None
+
+    key = cache_key()
+    with flights_lock:
+        flight = flights.get(key)
+        if flight is None:
+            flights[key] = g.coalesce_flight = Flight()
+            g.coalesce_key = key
+            return None
+
+    if not flight.done.wait(current_app.config['COALESCE_TIMEOUT']):
+        coalesce_timeouts.inc(request.endpoint)
+        return None
+    # A leader that failed with a server error or streamed its response leaves every request to run itself
+    if flight.response is None:
+        return None
+
+    coalesced_requests.inc(request.endpoint)
+    body, status, headers, generations = flight.response
+    # The body is cached under the generations the leader read before building it, not the ones read on arriving,
+    # which may already include a write the leader's body doesn't
+    if generations is None:
+        g.pop('response_cache_key', None)
+    else:
+        g.response_generations = generations
+    return current_app.response_class(body, status=status, headers=headers)
+
+
+def share_response(response):
+    """
+    Hands the leader's response to the requests waiting on it, and marks the client of a write
+    """
+    if (request.method in WRITE_METHODS and request.endpoint not in READ_ONLY_ENDPOINTS and response.status_code < 400
+            and current_app.config['COALESCE_ENABLED']):
+        response.set_cookie(WRITE_COOKIE, '1', max_age=current_app.config['COALESCE_WRITE_WINDOW'], httponly=True)
+
+    if 'coalesce_flight' in g and not response.is_streamed and response.status_code < 500:
+        headers = [(name, value) for name, value in response.headers if name.lower() not in UNSHARED_HEADERS]
+        g.coalesce_flight.response = (response.get_data(), response.status_code, headers,
+                                      g.get('response_generations'))
+    end_flight()
+    return response
+
+
+def end_flight(error=None):
+    # Runs again at teardown so a leader that failed still releases the requests waiting on it
+    flight = g.pop('coalesce_flight', None)
+    if flight is None:
+        return
+    with flights_lock:
+        flights.pop(g.pop('coalesce_key'), None)
+    flight.done.set()
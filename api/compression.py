@@ -0,0 +1,146 @@
+import zlib
+
+from flask import current_app, request
+
+from api.cache import LRUCache
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Mimetypes worth compressing besides text/*, the other responses of the API are already small or binary
+COMPRESSIBLE_MIMETYPES = {'application/json', 'application/x-ndjson'}
+
+# Compressed bodies keyed by the strong ETag of the uncompressed body, the encoding and the level,
+# so a hot page from the response cache is only compressed once per encoding
+compressed_bodies = LRUCache()
+
+
+class GzipEncoder(object):
+    name = 'gzip'
+
+    @staticmethod
+    def compressor(level):
+        # wbits of 31 writes a gzip header and trailer around the deflate stream
+        return zlib.compressobj(level, zlib.DEFLATED, 31)
+
+
+class BrotliCompressor(object):
+    """
+    The brotli compressor with the compress and flush methods of the zlib ones
+    """
+
+    def __init__(self, level):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.finish()
+
+
+class BrotliEncoder(object):
+    name = 'br'
+    compressor = BrotliCompressor
+
+
+class ZstdEncoder(object):
+    name = 'zstd'
+
+    @staticmethod
+    def compressor(level):
+        return zstandard.ZstdCompressor(level=level).compressobj()
+
+
+# The encodings whose libraries are installed, by Accept-Encoding name
+ENCODERS = {encoder.name: encoder for encoder, library in ((GzipEncoder, zlib), (BrotliEncoder, brotli),
+                                                           (ZstdEncoder, zstandard)) if library is not None}
+
+
+def init_app(app):
+    compressed_bodies.configure(app.config['COMPRESSION_CACHE_MAX_ENTRIES'],
+                                max_bytes=app.config['COMPRESSION_CACHE_MAX_BYTES'])
+
+
+def negotiate(accept_encodings):
+    """
+    :param accept_encodings: The parsed Accept-Encoding header of the request
+    :return: The installed encoding the client prefers, ties going to the first in COMPRESSION_ENCODINGS,
+    or None if the client accepts none of them
+    """
+    best, best_quality = None, 0
+    for name in current_app.config['COMPRESSION_ENCODINGS']:
+        quality = accept_encodings.quality(name) if name in ENCODERS else 0
+        if quality > best_quality:
+            best, best_quality = name, quality
+    return best
+
+
+def compressible(response):
+    return (current_app.config['COMPRESSION_ENABLED'] and request.method != 'HEAD'
+            and 200 <= response.status_code < 300 and response.status_code != 204
+            and 'Content-Encoding' not in response.headers
+            and (response.mimetype.startswith('text/') or response.mimetype in COMPRESSIBLE_MIMETYPES))
+
+
+def compress(body, encoding, level):
+    compressor = ENCODERS[encoding].compressor(level)
+    return compressor.compress(body) + compressor.flush()
+
+
+def compress_stream(chunks, encoding, level):
+    """
+    Compresses a streamed body as it's produced, a chunk is sent once the compressor has filled a block with it
+    """
+    compressor = ENCODERS[encoding].compressor(level)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode() if isinstance(chunk, str) else chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def compress_response(response):
+    """
+    Compresses the body of a response with the encoding negotiated from the request's Accept-Encoding,
+    streamed bodies are compressed incrementally and bodies smaller than COMPRESSION_MIN_SIZE are left as they are
+    """
+    if not compressible(response):
+        return response
+    response.vary.add('Accept-Encoding')
+
+    encoding = negotiate(request.accept_encodings)
+    if encoding is None:
+        return response
+    level = current_app.config['COMPRESSION_LEVELS'][encoding]
+
+    if response.is_streamed:
+        response.response = compress_stream(response.response, encoding, level)
+        response.headers.pop('Content-Length', None)
+    else:
+        body = response.get_data()
+        if len(body) < current_app.config['COMPRESSION_MIN_SIZE']:
+            return response
+
+        etag, _ = response.get_etag()
+        key = (etag, encoding, level)
+        compressed = compressed_bodies.get(key) if etag else None
+        if compressed is None:
+            compressed = compress(body, encoding, level)
+            if etag:
+                compressed_bodies.set(key, compressed, size=len(compressed))
+        response.set_data(compressed)
+        # The compressed body is a different representation, a weak ETag still matches the uncompressed one
+        # in If-None-Match so conditional requests keep working across encodings
+        if etag:
+            response.set_etag(etag, weak=True)
+
+    response.headers['Content-Encoding'] = encoding
+    return response
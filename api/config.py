@@ -1,12 +1,173 @@
 import os
+import tempfile
+
+from api.pool import TimedQueuePool
 
 class Config(object):
     TESTING = False
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Totals of paginated responses are cached until a write invalidates them or the ttl (seconds) expires. Only the
+    # writes of the same process invalidate them, so with several workers the ttl bounds how long a total is off
+    COUNT_CACHE_ENABLED = True
+    COUNT_CACHE_SIZE = 1024
+    COUNT_CACHE_TTL = 300
+
+    # Substring filters on indexed text columns are answered from an in memory n-gram index, built in the background
+    # from the first search. Queries are filtered by the matching ids only while there are at most SEARCH_INDEX_MAX_IDS
+    # of them. Each process only sees its own writes, so an index older than SEARCH_INDEX_MAX_AGE (seconds) is rebuilt,
+    # with searches going to the database meanwhile
+    SEARCH_INDEX_ENABLED = True
+    SEARCH_INDEX_MAX_IDS = 500
+    SEARCH_INDEX_MAX_AGE = 300
+
+    # GET responses always get a strong ETag and are answered with a 304 when it matches If-None-Match. When the cache
+    # is enabled they're also cached until a write bumps the generation of a table they read from, or the ttl (seconds)
+    # expires. The generations are kept by each process, so with several workers the ttl bounds how long a worker
+    # serves responses from before another worker's write
+    RESPONSE_CACHE_ENABLED = True
+    RESPONSE_CACHE_MAX_ENTRIES = 4096
+    RESPONSE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+    RESPONSE_CACHE_TTL = None
+
+    # The number of items validated and inserted at a time by the bulk create routes
+    BULK_CHUNK_SIZE = 1000
+
+    # List responses are serialized from row tuples and encoded with orjson (when installed),
+    # set to False to always serialize through marshmallow and the standard library
+    FAST_SERIALIZER = True
+
+    # The number of rows fetched at a time from the server side cursor of the export routes
+    EXPORT_BATCH_SIZE = 1000
+
+    # The largest per_page of page paginated responses, larger values are clamped to it
+    MAX_PER_PAGE = 500
+
+    # Limits on the ids read at once with ?ids= and the sub-requests of one /api/batch call
+    MAX_IDS = 1000
+    BATCH_MAX_REQUESTS = 50
+
+    # The number of link changes held on top of the co-star graph before it is rebuilt, and its age (seconds) at
+    # which it's rebuilt to see the writes of other processes
+    COSTAR_REBUILD_THRESHOLD = 10000
+    COSTAR_MAX_AGE = 300
+
+    # The number of changed films scored from their links before the similarity index is recompiled, and its age
+    # (seconds) at which it's rebuilt to see the writes of other processes
+    SIMILARITY_RECOMPILE_THRESHOLD = 1000
+    SIMILARITY_MAX_AGE = 300
+
+    # The age (seconds) at which the in memory summaries of the stats routes are rebuilt to see the writes of other
+    # processes
+    STATS_MAX_AGE = 300
+
+    # Latency, SQL, serialization and response size histograms are exported on /metrics,
+    # and ?_profile=1 returns a cProfile summary and the executed SQL of a request instead of its response
+    METRICS_ENABLED = True
+    PROFILING_ENABLED = True
+
+    # Queries slower than the threshold (seconds) are logged with their plan, as are requests that run one
+    # statement shape more than N_PLUS_ONE_THRESHOLD times, in a ring buffer at /admin/slow-queries and in a JSONL file
+    # when SLOW_QUERY_LOG_FILE is set
+    SLOW_QUERY_LOG_ENABLED = True
+    SLOW_QUERY_THRESHOLD = 0.1
+    SLOW_QUERY_EXPLAIN = True
+    N_PLUS_ONE_THRESHOLD = 10
+    SLOW_QUERY_LOG_SIZE = 1000
+    SLOW_QUERY_LOG_FILE = os.getenv('SLOW_QUERY_LOG_FILE')
+
+    # The /admin diagnostics serve the SQL and parameters of slow queries, when ADMIN_TOKEN is set they're only served
+    # to requests with an 'Authorization: Bearer <ADMIN_TOKEN>' header
+    ADMIN_ENABLED = True
+    ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
+
+    # The database of the async app from create_async_app, the sync database with an async driver if unset
+    ASYNC_DATABASE_URI = os.getenv('ASYNC_DATABASE_URI')
+
+    # Identical GET requests in flight at once share one response, requests wait on it for at most the timeout
+    # (seconds), and clients that wrote in the last COALESCE_WRITE_WINDOW seconds are never coalesced
+    COALESCE_ENABLED = True
+    COALESCE_TIMEOUT = 5
+    COALESCE_WRITE_WINDOW = 5
+
+    # Read only snapshot mode, entity and relationship list reads are answered from a memory mapped snapshot file
+    # shared by every worker. It's rebuilt in the background SNAPSHOT_REFRESH_DELAY seconds after a write, once for a
+    # burst of writes, with reads of the writing worker going to the database meanwhile, and when it's older than the
+    # interval (seconds)
+    SNAPSHOT_ENABLED = False
+    SNAPSHOT_PATH = os.getenv('SNAPSHOT_PATH', os.path.join(tempfile.gettempdir(), 'sakila-catalogue.snapshot'))
+    SNAPSHOT_REFRESH_INTERVAL = 300
+    SNAPSHOT_REFRESH_DELAY = 0.5
+
+    # Responses of the API of at least COMPRESSION_MIN_SIZE bytes are compressed with the encoding the client
+    # prefers, in this order on ties (br and zstd when brotli and zstandard are installed), at the level of each
+    # encoding. Compressed bodies are cached by the ETag of the uncompressed body
+    COMPRESSION_ENABLED = True
+    COMPRESSION_ENCODINGS = ['br', 'zstd', 'gzip']
+    COMPRESSION_LEVELS = {'br': 4, 'zstd': 3, 'gzip': 6}
+    COMPRESSION_MIN_SIZE = 1024
+    COMPRESSION_CACHE_MAX_ENTRIES = 4096
+    COMPRESSION_CACHE_MAX_BYTES = 16 * 1024 * 1024
+
+    # Each route runs at most its concurrency limit of requests at once, with at most ADMISSION_QUEUE_SIZE more
+    # waiting up to ADMISSION_QUEUE_TIMEOUT seconds for room, the rest are answered with a 503 and Retry-After.
+    # A route's limit grows by one per limit's worth of requests faster than the latency target (seconds), and is
+    # multiplied by the backoff for each slower one. ADMISSION_ROUTES overrides these settings by endpoint, e.g.
+    # {'api.films.read_all_films': {'limit': 4, 'max_limit': 16}}
+    ADMISSION_ENABLED = True
+    ADMISSION_INITIAL_LIMIT = 32
+    ADMISSION_MIN_LIMIT = 1
+    ADMISSION_MAX_LIMIT = 256
+    ADMISSION_QUEUE_SIZE = 64
+    ADMISSION_QUEUE_TIMEOUT = 2
+    ADMISSION_LATENCY_TARGET = 1.0
+    ADMISSION_BACKOFF = 0.9
+    ADMISSION_ROUTES = {}
+
+    # The single link routes queue their change for a thread that commits the changes of concurrent requests in one
+    # transaction, every GROUP_COMMIT_INTERVAL seconds or GROUP_COMMIT_MAX_OPERATIONS changes, and each request
+    # answers once its batch has committed, or with a 503 after GROUP_COMMIT_TIMEOUT seconds
+    GROUP_COMMIT_ENABLED = False
+    GROUP_COMMIT_INTERVAL = 0.005
+    GROUP_COMMIT_MAX_OPERATIONS = 500
+    GROUP_COMMIT_TIMEOUT = 10
+
+    # Bind keys of read replicas, the reads of GET requests are spread over them round robin
+    REPLICA_BINDS = []
+    # Seconds after a write commits during which reads stay on the primary, at least the replicas' usual lag
+    REPLICA_LAG_WINDOW = 2
+
 
 class ProdConfig(Config):
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URI')
+    PROFILING_ENABLED = False
+    # The diagnostics are opt in, and should be given an ADMIN_TOKEN when they're on
+    ADMIN_ENABLED = os.getenv('ADMIN_ENABLED', 'false').lower() == 'true'
+
+    # Production runs several workers, whose caches and in memory indexes only see their own writes, so the response
+    # cache is opt in, cached responses and totals expire after seconds, and the indexes are rebuilt sooner
+    RESPONSE_CACHE_ENABLED = os.getenv('RESPONSE_CACHE_ENABLED', 'false').lower() == 'true'
+    RESPONSE_CACHE_TTL = float(os.getenv('RESPONSE_CACHE_TTL', 5))
+    COUNT_CACHE_TTL = float(os.getenv('COUNT_CACHE_TTL', 5))
+    SEARCH_INDEX_MAX_AGE = float(os.getenv('SEARCH_INDEX_MAX_AGE', 30))
+    COSTAR_MAX_AGE = float(os.getenv('COSTAR_MAX_AGE', 30))
+    SIMILARITY_MAX_AGE = float(os.getenv('SIMILARITY_MAX_AGE', 30))
+    STATS_MAX_AGE = float(os.getenv('STATS_MAX_AGE', 30))
+
+    # The connection pool of the primary and of every replica, pool stats are served at /admin/pool
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'poolclass': TimedQueuePool,
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': float(os.getenv('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+    }
+
+    # A comma separated list of replica URIs, each is bound as replica_<n>
+    SQLALCHEMY_BINDS = {f'replica_{index}': uri
+                        for index, uri in enumerate(filter(None, os.getenv('DATABASE_REPLICA_URIS', '').split(',')))}
+    REPLICA_BINDS = list(SQLALCHEMY_BINDS)
 
 
 class DevConfig(Config):
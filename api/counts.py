@@ -0,0 +1,113 @@
+from flask import current_app
+from sqlalchemy import func, inspect, text
+
+from api.cache import LRUCache
+from api.models import db
+from api.signals import entities_changed, links_changed
+
+# Total counts of paginated queries keyed by (table name, owner, filters)
+# where the owner is the (table name, id) of the entity a relationship list belongs to
+count_cache = LRUCache()
+
+ESTIMATE_QUERIES = {
+    'mysql': "SELECT TABLE_ROWS FROM information_schema.TABLES "
+             "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table",
+    'postgresql': "SELECT reltuples::bigint FROM pg_class WHERE relname = :table"
+}
+
+
+def init_app(app):
+    count_cache.configure(app.config['COUNT_CACHE_SIZE'], app.config['COUNT_CACHE_TTL'])
+
+
+def owner_key(owner):
+    """
+    :param owner: The entity a relationship list belongs to, or None
+    :return: The (table name, id) of the owner, or None
+    """
+    if owner is None:
+        return None
+    return owner.__tablename__, inspect(owner).identity[0]
+
+
+def count_key(model, filters, owner=None):
+    """
+    :param model: The database model being counted
+    :param filters: The arguments filtered on in [(field,value),...] form.
+    :param owner: The entity a relationship list belongs to, or None
+    :return: A key for the count that ignores filter order and unused filters
+    """
+    return model.__tablename__, owner_key(owner), tuple(sorted((field, value) for field, value in filters if value))
+
+
+def estimate_count(model):
+    """
+    :param model: The database model to estimate the size of
+    :return: The row estimate the database keeps for the model's table, or None if it isn't available
+    """
+    query = ESTIMATE_QUERIES.get(db.engine.dialect.name)
+    if query is None:
+        return None
+    estimate = db.session.execute(text(query), {'table': model.__tablename__}).scalar()
+    return int(estimate) if estimate is not None and estimate >= 0 else None
+
+
+def count_entities(model, entities, filters, owner=None, mode='exact'):
+    """
+    :param model: The database model for the entities
+    :param entities: The filtered database entities to count
+    :param filters: The arguments the entities were filtered on in [(field,value),...] form.
+    :param owner: The entity a relationship list belongs to, or None
+    :param mode: 'none' to skip counting, 'estimate' to allow the database's row estimate, or 'exact'
+    :return: The total and whether it is an estimate, the total is None if counting was skipped
+    """
+    if mode == 'none':
+        return None, False
+
+    key = count_key(model, filters, owner)
+    total = count_cache.get(key)
+    if total is not None:
+        return total, False
+
+    # The table estimate is only meaningful for an unfiltered top level list
+    if mode == 'estimate' and key[1] is None and not key[2]:
+        total = estimate_count(model)
+        if total is not None:
+            return total, True
+
+    # Counting the primary key alone keeps the count from selecting every column in a subquery
+    total = entities.order_by(None).with_entities(func.count(inspect(model).primary_key[0])).scalar()
+    if current_app.config['COUNT_CACHE_ENABLED']:
+        count_cache.set(key, total)
+    return total, False
+
+
+@entities_changed.connect
+def invalidate_entity_counts(model, action, ids, **kwargs):
+    """
+    Drops every count of the model, and for deletes every relationship list the deleted entities owned
+    """
+    table = model.__tablename__
+    owners = {(table, entity_id) for entity_id in ids or ()}
+
+    def stale(key):
+        if key[0] == table:
+            return True
+        if action != 'delete' or key[1] is None:
+            return False
+        return key[1] in owners if ids is not None else key[1][0] == table
+
+    count_cache.discard(stale)
+
+
+@links_changed.connect
+def invalidate_link_counts(table, action, pairs, **kwargs):
+    """
+    Drops the counts of the relationship lists on both sides of the changed links
+    """
+    tables = [next(iter(column.foreign_keys)).column.table.name for column in table.columns if column.foreign_keys]
+    stale = set()
+    for pair in pairs:
+        stale.add((tables[1], (tables[0], pair[0])))
+        stale.add((tables[0], (tables[1], pair[1])))
+    count_cache.discard(lambda key: key[:2] in stale)
@@ -0,0 +1,46 @@
+from collections import defaultdict
+from threading import Lock
+
+from api.models import film_actor, film_category
+from api.signals import entities_changed, links_changed
+
+# A counter per table that is bumped every time a write to the table is committed
+generations = defaultdict(int)
+_lock = Lock()
+
+# The association tables whose rows are removed along with a row of the table
+LINKED_TABLES = {
+    'film': [film_actor.name, film_category.name],
+    'actor': [film_actor.name],
+    'category': [film_category.name]
+}
+
+
+def bump(*tables):
+    """
+    :param tables: The names of the tables that have been written to
+    """
+    with _lock:
+        for table in tables:
+            generations[table] += 1
+
+
+def snapshot(tables):
+    """
+    :param tables: The names of tables
+    :return: The current generation of each of the tables
+    """
+    return tuple(generations[table] for table in sorted(tables))
+
+
+@entities_changed.connect
+def bump_entities(model, action, ids, **kwargs):
+    tables = [model.__tablename__]
+    if action == 'delete':
+        tables += LINKED_TABLES.get(model.__tablename__, [])
+    bump(*tables)
+
+
+@links_changed.connect
+def bump_links(table, action, pairs, **kwargs):
+    bump(table.name)
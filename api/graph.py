@@ -0,0 +1,210 @@
+from array import array
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict, deque
+from threading import RLock
+
+from flask import current_app
+from sqlalchemy import select
+
+from api.models import db, film_actor, primary_reads
+from api.models.actor import Actor
+from api.models.film import Film
+from api.signals import entities_changed, links_changed
+
+
+class CSRIndex(object):
+    """
+    A compressed sparse row adjacency index, the neighbours of keys[i] are values[offsets[i]:offsets[i + 1]]
+    """
+
+    def __init__(self, pairs):
+        """
+        :param pairs: (key, value) pairs sorted by key then value
+        """
+        self.keys = array('i')
+        self.offsets = array('i', [0])
+        self.values = array('i')
+        for key, value in pairs:
+            if not self.keys or self.keys[-1] != key:
+                self.keys.append(key)
+                if len(self.keys) > 1:
+                    self.offsets.append(len(self.values))
+            self.values.append(value)
+        self.offsets.append(len(self.values))
+
+    def neighbours(self, key):
+        """
+        :param key: A key of the index
+        :return: The sorted values linked to the key
+        """
+        i = bisect_left(self.keys, key)
+        if i == len(self.keys) or self.keys[i] != key:
+            return self.values[0:0]
+        return self.values[self.offsets[i]:self.offsets[i + 1]]
+
+    def contains(self, key, value):
+        values = self.neighbours(key)
+        i = bisect_left(values, value)
+        return i < len(values) and values[i] == value
+
+
+class CostarGraph(object):
+    """
+    The bipartite actor/film graph of the film_actor table, held as a pair of CSR indexes
+    with a small overlay of the links changed since they were built. Only the writes of its own process are
+    in the overlay, so the graph is rebuilt on the first read once it's older than COSTAR_MAX_AGE
+    """
+
+    def __init__(self):
+        self._lock = RLock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.built = False
+            self.built_at = None
+            self._films = self._actors = None
+            self._added_films = defaultdict(set)
+            self._added_actors = defaultdict(set)
+            self._removed = set()
+
+    def build(self):
+        """
+        Reads every link in the film_actor table and indexes it in both directions
+        """
+        with self._lock, primary_reads():
+            self.reset()
+            read_at = time.monotonic()
+            columns = film_actor.c.actor_id, film_actor.c.film_id
+            pairs = db.session.execute(select(*columns).order_by(*columns)).all()
+            self._films = CSRIndex(pairs)
+            self._actors = CSRIndex(sorted((film_id, actor_id) for actor_id, film_id in pairs))
+            self.built = True
+            self.built_at = read_at
+
+    def ensure_built(self):
+        with self._lock:
+            max_age = current_app.config['COSTAR_MAX_AGE']
+            if not self.built or (max_age is not None and time.monotonic() - self.built_at > max_age):
+                self.build()
+
+    def films_of(self, actor_id):
+        """
+        :param actor_id: The id of an actor
+        :return: The ids of the films the actor stars in
+        """
+        with self._lock:
+            self.ensure_built()
+            films = [film_id for film_id in self._films.neighbours(actor_id) if (actor_id, film_id) not in self._removed]
+            return films + sorted(self._added_films[actor_id])
+
+    def actors_of(self, film_id):
+        """
+        :param film_id: The id of a film
+        :return: The ids of the actors starring in the film
+        """
+        with self._lock:
+            self.ensure_built()
+            actors = [actor_id for actor_id in self._actors.neighbours(film_id) if (actor_id, film_id) not in self._removed]
+            return actors + sorted(self._added_actors[film_id])
+
+    def add(self, actor_id, film_id):
+        with self._lock:
+            if not self.built:
+                return
+            if (actor_id, film_id) in self._removed:
+                self._removed.discard((actor_id, film_id))
+            elif not self._films.contains(actor_id, film_id):
+                self._added_films[actor_id].add(film_id)
+                self._added_actors[film_id].add(actor_id)
+            self._check_overlay()
+
+    def remove(self, actor_id, film_id):
+        with self._lock:
+            if not self.built:
+                return
+            if film_id in self._added_films[actor_id]:
+                self._added_films[actor_id].discard(film_id)
+                self._added_actors[film_id].discard(actor_id)
+            elif self._films.contains(actor_id, film_id):
+                self._removed.add((actor_id, film_id))
+            self._check_overlay()
+
+    def costars(self, actor_id):
+        """
+        :param actor_id: The id of an actor
+        :return: [(actor id, number of shared films),...] of everyone the actor has starred with, most shared first
+        """
+        counts = Counter()
+        with self._lock:
+            for film_id in self.films_of(actor_id):
+                counts.update(self.actors_of(film_id))
+        counts.pop(actor_id, None)
+        return sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+
+    def path(self, source_id, target_id):
+        """
+        Breadth first search through shared films
+        :param source_id: The id of the actor to start from
+        :param target_id: The id of the actor to reach
+        :return: The actor ids and the film ids linking them on a shortest path, or None if there is no path
+        """
+        previous = {source_id: None}
+        queue = deque([source_id])
+        with self._lock:
+            while queue and target_id not in previous:
+                actor_id = queue.popleft()
+                for film_id in self.films_of(actor_id):
+                    for costar_id in self.actors_of(film_id):
+                        if costar_id not in previous:
+                            previous[costar_id] = (actor_id, film_id)
+                            queue.append(costar_id)
+        if target_id not in previous:
+            return None
+
+        actors, films = [target_id], []
+        while previous[actors[-1]] is not None:
+            actor_id, film_id = previous[actors[-1]]
+            actors.append(actor_id)
+            films.append(film_id)
+        return actors[::-1], films[::-1]
+
+    def _check_overlay(self):
+        # Once the overlay gets big it is cheaper to rebuild the indexes on the next read
+        size = len(self._removed) + sum(len(films) for films in self._added_films.values())
+        if size > current_app.config['COSTAR_REBUILD_THRESHOLD']:
+            self.reset()
+
+
+costar_graph = CostarGraph()
+
+
+def init_app(app):
+    # The graph is built from the database on the first read after startup
+    costar_graph.reset()
+
+
+@links_changed.connect_via(film_actor)
+def update_costar_links(table, action, pairs, **kwargs):
+    for actor_id, film_id in pairs:
+        if action == 'add':
+            costar_graph.add(actor_id, film_id)
+        else:
+            costar_graph.remove(actor_id, film_id)
+
+
+@entities_changed.connect
+def update_costar_entities(model, action, ids, **kwargs):
+    if action != 'delete' or model not in (Actor, Film):
+        return
+    if ids is None or not costar_graph.built:
+        costar_graph.reset()
+        return
+    for entity_id in ids:
+        if model is Actor:
+            for film_id in costar_graph.films_of(entity_id):
+                costar_graph.remove(entity_id, film_id)
+        else:
+            for actor_id in costar_graph.actors_of(entity_id):
+                costar_graph.remove(actor_id, entity_id)
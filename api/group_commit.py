@@ -0,0 +1,158 @@
+import queue
+import threading
+import time
+
+from flask import abort
+from sqlalchemy import delete, insert, select, tuple_
+from sqlalchemy.exc import IntegrityError
+
+from api.models import db
+from api.signals import links_changed
+
+
+class LinkOperation(object):
+    """
+    A link change queued by a request, the request waits on done and raises error if it's set. A change that
+    would fail (adding a link that exists, removing one that doesn't) is rejected and left for the request to make
+    on its own, so it fails with the same error as without group commit
+    """
+
+    def __init__(self, table, action, pair):
+        self.table = table
+        self.action = action
+        self.pair = pair
+        self.done = threading.Event()
+        self.error = None
+        self.rejected = False
+
+
+class LinkBatcher(object):
+    """
+    Commits the link changes of concurrent requests together. A thread takes the changes off a queue until
+    GROUP_COMMIT_MAX_OPERATIONS of them or GROUP_COMMIT_INTERVAL seconds after the first, applies them in one
+    transaction and then releases the requests that queued them
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, table, action, pair):
+        """
+        Queues a link change and waits for the batch it's part of to commit
+        :param table: The association table holding the link
+        :param action: 'add' or 'remove'
+        :param pair: The ids of the link in the table's primary key column order
+        :return: True once the change has committed, False if the batch rejected it
+        """
+        operation = LinkOperation(table, action, pair)
+        self._start()
+        self._queue.put(operation)
+        if not operation.done.wait(self.app.config['GROUP_COMMIT_TIMEOUT']):
+            # The change may still commit with a late batch, so the client can't assume it didn't happen
+            abort(503, "The link change did not commit in time, its batch may still commit")
+        if operation.error is not None:
+            raise operation.error
+        return not operation.rejected
+
+    def _start(self):
+        # Started on the first change rather than with the app, so each worker process has its own thread
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='link-group-commit', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            operations = [self._queue.get()]
+            deadline = time.monotonic() + self.app.config['GROUP_COMMIT_INTERVAL']
+            while len(operations) < self.app.config['GROUP_COMMIT_MAX_OPERATIONS']:
+                try:
+                    operations.append(self._queue.get(timeout=max(0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            self._flush(operations)
+
+    def _flush(self, operations):
+        try:
+            with self.app.app_context():
+                try:
+                    changes = self._apply(operations)
+                    db.session.commit()
+                except IntegrityError:
+                    # A link written since the batch read the existing ones, or an entity deleted since the request
+                    # read it, so each change is retried on its own to fail only the one it belongs to
+                    db.session.rollback()
+                    for operation in operations:
+                        operation.rejected = False
+                    changes = self._apply_each(operations)
+
+                for table, (added, removed) in changes.items():
+                    if added:
+                        links_changed.send(table, action='add', pairs=sorted(added))
+                    if removed:
+                        links_changed.send(table, action='remove', pairs=sorted(removed))
+        except Exception as error:
+            self.app.logger.exception("Group commit of %d link changes failed", len(operations))
+            for operation in operations:
+                if operation.error is None:
+                    operation.error = error
+        finally:
+            for operation in operations:
+                operation.done.set()
+
+    def _apply(self, operations):
+        """
+        Decides the outcome of each change in queue order against the links that exist, then writes the net changes
+        of each table with one insert and one delete
+        :return: The pairs added and removed, by table
+        """
+        changes = {}
+        for table in dict.fromkeys(operation.table for operation in operations):
+            table_operations = [operation for operation in operations if operation.table is table]
+            columns = list(table.primary_key.columns)
+            pairs = {operation.pair for operation in table_operations}
+            existing = {tuple(row) for row in db.session.execute(select(*columns).where(tuple_(*columns).in_(pairs)))}
+
+            linked = set(existing)
+            for operation in table_operations:
+                if (operation.pair in linked) == (operation.action == 'add'):
+                    operation.rejected = True
+                elif operation.action == 'add':
+                    linked.add(operation.pair)
+                else:
+                    linked.remove(operation.pair)
+
+            added, removed = linked - existing, existing - linked
+            if added:
+                keys = [column.key for column in columns]
+                db.session.execute(insert(table), [dict(zip(keys, pair)) for pair in sorted(added)])
+            if removed:
+                db.session.execute(delete(table).where(tuple_(*columns).in_(removed)))
+            changes[table] = added, removed
+        return changes
+
+    def _apply_each(self, operations):
+        """
+        :return: The pairs added and removed by the changes that committed, each in its own transaction
+        """
+        changes = {}
+        for operation in operations:
+            try:
+                applied = self._apply([operation])
+                db.session.commit()
+            except IntegrityError:
+                db.session.rollback()
+                operation.rejected = True
+                continue
+            for table, (added, removed) in applied.items():
+                table_added, table_removed = changes.setdefault(table, (set(), set()))
+                table_added |= added
+                table_removed |= removed
+        return changes
+
+
+def init_app(app):
+    app.extensions['link_batcher'] = LinkBatcher(app)
@@ -0,0 +1,30 @@
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Encodes compact responses with orjson when it is installed, falling back to the standard library
+    whenever the output could differ from what Flask's default provider produces
+    """
+
+    def dumps(self, obj, **kwargs):
+        if (orjson is None or not self._app.config['FAST_SERIALIZER']
+                or kwargs != {"separators": (",", ":")} or not self.sort_keys or not self.ensure_ascii):
+            return super().dumps(obj, **kwargs)
+
+        try:
+            # Dates and dataclasses go through the same default function as the standard library
+            data = orjson.dumps(obj, default=self.default, option=orjson.OPT_SORT_KEYS
+                                | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS)
+        except TypeError:
+            return super().dumps(obj, **kwargs)
+
+        # The standard library escapes non ascii characters, orjson doesn't
+        if not data.isascii():
+            return super().dumps(obj, **kwargs)
+        return data.decode()
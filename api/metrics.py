@@ -0,0 +1,236 @@
+import cProfile
+import io
+import pstats
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from threading import Lock
+
+from flask import current_app, g, has_app_context, request, Response
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Upper bounds of the histogram buckets of each kind of measurement
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+# The number of functions listed in the summary of a profiled request
+PROFILE_FUNCTIONS = 30
+
+
+class Histogram(object):
+    """
+    A Prometheus style histogram with a series of bucket counts for each endpoint
+    """
+
+    def __init__(self, name, description, buckets):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        self._lock = Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            # endpoint: (count in each bucket and one past the last, sum)
+            self.series = {}
+
+    def observe(self, endpoint, value):
+        with self._lock:
+            counts, total = self.series.get(endpoint, ([0] * (len(self.buckets) + 1), 0))
+            counts[bisect_left(self.buckets, value)] += 1
+            self.series[endpoint] = (counts, total + value)
+
+    def exposition(self):
+        """
+        :return: The lines of the histogram in the Prometheus text format
+        """
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((endpoint, list(counts), total) for endpoint, (counts, total) in self.series.items())
+        for endpoint, counts, total in series:
+            label = f'endpoint="{escape_label(endpoint)}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {cumulative}')
+            cumulative += counts[-1]
+            lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{label}}} {total}')
+            lines.append(f'{self.name}_count{{{label}}} {cumulative}')
+        return lines
+
+
+class Counter(object):
+    """
+    A Prometheus style counter for each endpoint
+    """
+
+    def __init__(self, name, description):
+        self.name = name
+        self.description = description
+        self._lock = Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.series = {}
+
+    def inc(self, endpoint, amount=1):
+        with self._lock:
+            self.series[endpoint] = self.series.get(endpoint, 0) + amount
+
+    def exposition(self):
+        """
+        :return: The lines of the counter in the Prometheus text format
+        """
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            series = sorted(self.series.items())
+        lines.extend(f'{self.name}{{endpoint="{escape_label(endpoint)}"}} {value}' for endpoint, value in series)
+        return lines
+
+
+request_duration = Histogram('http_request_duration_seconds',
+                             'Time spent handling requests', LATENCY_BUCKETS)
+sql_statements = Histogram('http_request_sql_statements',
+                           'SQL statements executed per request', COUNT_BUCKETS)
+sql_duration = Histogram('http_request_sql_duration_seconds',
+                         'Time spent executing SQL statements per request', LATENCY_BUCKETS)
+serialization_duration = Histogram('http_request_serialization_duration_seconds',
+                                   'Time spent serializing paginated entities per request', LATENCY_BUCKETS)
+response_size = Histogram('http_response_size_bytes',
+                          'Size of response bodies, streamed responses are not counted', SIZE_BUCKETS)
+
+HISTOGRAMS = (request_duration, sql_statements, sql_duration, serialization_duration, response_size)
+
+coalesced_requests = Counter('http_requests_coalesced_total',
+                             'GET requests answered with the response of an identical request already in flight')
+coalesce_timeouts = Counter('http_requests_coalesce_timeouts_total',
+                            'GET requests that stopped waiting on an identical request in flight and ran themselves')
+shed_requests = Counter('http_requests_shed_total',
+                        'Requests answered with a 503 because the queue of their route was full or the wait timed out')
+
+COUNTERS = (coalesced_requests, coalesce_timeouts, shed_requests)
+
+# Only one request is profiled at a time, others asking for a profile are served normally
+profile_lock = Lock()
+
+
+def escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def init_app(app):
+    for metric in HISTOGRAMS + COUNTERS:
+        metric.reset()
+    if not app.config['METRICS_ENABLED']:
+        return
+
+    app.before_request(start_request)
+    app.after_request(record_request)
+    app.teardown_request(stop_profiler)
+    app.add_url_rule('/metrics', 'metrics', export_metrics)
+
+
+def recording():
+    return has_app_context() and 'request_start' in g
+
+
+def start_request():
+    g.request_start = time.perf_counter()
+    g.sql_statements = 0
+    g.sql_duration = 0.0
+    g.serialization_duration = 0.0
+
+    if request.args.get('_profile') == '1' and current_app.config['PROFILING_ENABLED'] \
+            and profile_lock.acquire(blocking=False):
+        g.executed_sql = []
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+
+def record_request(response):
+    """
+    Records the measurements of the request, and replaces the response with its profile when one was taken
+    """
+    duration = time.perf_counter() - g.request_start
+    endpoint = request.endpoint or 'unmatched'
+    request_duration.observe(endpoint, duration)
+    sql_statements.observe(endpoint, g.sql_statements)
+    sql_duration.observe(endpoint, g.sql_duration)
+    serialization_duration.observe(endpoint, g.serialization_duration)
+    if not response.is_streamed:
+        response_size.observe(endpoint, response.calculate_content_length() or 0)
+
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+        return response
+
+    profiler.disable()
+    profile_lock.release()
+    summary = io.StringIO()
+    pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(PROFILE_FUNCTIONS)
+    return current_app.json.response({
+        "status": response.status_code,
+        "duration": duration,
+        "response_size": None if response.is_streamed else response.calculate_content_length(),
+        "sql_duration": g.sql_duration,
+        "serialization_duration": g.serialization_duration,
+        "sql": g.executed_sql,
+        "profile": summary.getvalue()
+    })
+
+
+def stop_profiler(error=None):
+    # A request that failed before its response was recorded still gives up the profiler
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        profile_lock.release()
+
+
+@contextmanager
+def serialization_timer():
+    """
+    Adds the time spent in the block to the serialization time of the request
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if recording():
+            g.serialization_duration += time.perf_counter() - start
+
+
+def export_metrics():
+    """
+    :return: Every histogram and counter in the Prometheus text format
+    """
+    lines = [line for metric in HISTOGRAMS + COUNTERS for line in metric.exposition()]
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_statement(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('statement_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def record_statement(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - conn.info['statement_start'].pop()
+    if not recording():
+        return
+
+    g.sql_statements += 1
+    g.sql_duration += duration
+    if 'executed_sql' in g:
+        g.executed_sql.append({"statement": statement, "parameters": repr(parameters), "duration": duration})
+
+
+@event.listens_for(Engine, 'handle_error')
+def discard_statement(context):
+    # A statement that failed never reaches after_cursor_execute
+    if context.connection is not None and context.connection.info.get('statement_start'):
+        context.connection.info['statement_start'].pop()
@@ -1,6 +1,10 @@
+from contextlib import contextmanager
+
 from flask_sqlalchemy import SQLAlchemy
 
-db = SQLAlchemy()
+from api.models.routing import RoutingSession
+
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 
 film_actor = db.Table('film_actor',
                       db.Column('actor_id', db.Integer, db.ForeignKey('actor.actor_id'), primary_key=True),
@@ -11,3 +15,18 @@ film_category = db.Table('film_category',
                          db.Column('category_id', db.Integer, db.ForeignKey('category.category_id'), primary_key=True),
                          db.Column('film_id', db.Integer, db.ForeignKey('film.film_id'), primary_key=True),
                          db.Column('last_update', db.Date))
+
+
+@contextmanager
+def primary_reads():
+    """
+    Reads from the primary inside the block even in a GET request, for data that's kept after the request and
+    mustn't miss writes a replica hasn't caught up with yet
+    """
+    session = db.session()
+    previous = session.info.get('primary', False)
+    session.info['primary'] = True
+    try:
+        yield
+    finally:
+        session.info['primary'] = previous
@@ -8,3 +8,6 @@ class Actor(db.Model):
     last_name = db.Column(db.String(255), nullable=False)
 
     films = db.relationship('Film', secondary='film_actor', back_populates='actors',lazy='dynamic')
+
+    # A non dynamic version of the relationship, this can be eager loaded
+    film_list = db.relationship('Film', secondary='film_actor', viewonly=True)
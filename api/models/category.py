@@ -7,3 +7,6 @@ class Category(db.Model):
     name = db.Column(db.String(255), nullable=False)
 
     films = db.relationship('Film', secondary='film_category', back_populates='categories', lazy='dynamic')
+
+    # A non dynamic version of the relationship, this can be eager loaded
+    film_list = db.relationship('Film', secondary='film_category', viewonly=True)
@@ -11,3 +11,7 @@ class Film(db.Model):
 
     actors = db.relationship('Actor', secondary='film_actor', back_populates='films',lazy='dynamic')
     categories = db.relationship('Category', secondary='film_category', back_populates='films', lazy='dynamic')
+
+    # Non dynamic versions of the relationships, these can be eager loaded
+    actor_list = db.relationship('Actor', secondary='film_actor', viewonly=True)
+    category_list = db.relationship('Category', secondary='film_category', viewonly=True)
@@ -0,0 +1,46 @@
+import itertools
+import time
+
+from flask import current_app, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy.sql import Select
+from sqlalchemy.sql.dml import UpdateBase
+
+# Turns of the replicas, shared by every session so reads are spread evenly
+replica_turns = itertools.count()
+
+# When this process last committed a write. Replicas may not have caught up with it yet, and a response read from one
+# would be cached under the generations the write bumped, so every read goes to the primary for REPLICA_LAG_WINDOW
+# seconds after it
+last_write = float('-inf')
+
+
+class RoutingSession(Session):
+    """
+    A session that sends the reads of GET requests to one of the replica binds in REPLICA_BINDS, and everything
+    else to the primary. Sessions take the replicas round robin, and each keeps to its replica so the statements of
+    a request (a count and its page) see the same data through one connection. Once a session has written, the rest of its request reads from the primary so it sees
+    its own writes, and every session reads from the primary for a while after a write commits
+    """
+
+    def commit(self):
+        super().commit()
+        if self.info.get('wrote'):
+            global last_write
+            last_write = time.monotonic()
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self.reads_from_replica(clause):
+            if 'replica' not in self.info:
+                replicas = current_app.config['REPLICA_BINDS']
+                self.info['replica'] = replicas[next(replica_turns) % len(replicas)]
+            return self._db.engines[self.info['replica']]
+        return super().get_bind(mapper, clause=clause, bind=bind, **kwargs)
+
+    def reads_from_replica(self, clause):
+        if self._flushing or isinstance(clause, UpdateBase):
+            self.info['wrote'] = True
+        return (isinstance(clause, Select) and not self.info.get('wrote') and not self.info.get('primary')
+                and has_request_context() and request.method in ('GET', 'HEAD')
+                and bool(current_app.config['REPLICA_BINDS'])
+                and time.monotonic() - last_write >= current_app.config['REPLICA_LAG_WINDOW'])
@@ -0,0 +1,114 @@
+import hashlib
+
+from flask import current_app, g, request, Response
+
+from api.cache import LRUCache
+from api.generations import snapshot
+from api.models import film_actor, film_category
+
+# Serialized GET responses keyed by path and normalized query args
+response_cache = LRUCache()
+
+# The tables behind each resource name that can appear in a path or an include arg
+RESOURCE_TABLES = {
+    'films': 'film',
+    'actors': 'actor',
+    'categories': 'category'
+}
+
+# Path segments of routes computed from other tables, and the tables they're computed from
+DERIVED_TABLES = {
+    'costars': {'film', film_actor.name},
+    'path': {'film', film_actor.name},
+    'similar': {'actor', 'category', film_actor.name, film_category.name},
+    'stats': {'film', 'category', film_actor.name, film_category.name}
+}
+
+LINK_TABLES = {
+    frozenset(('film', 'actor')): film_actor.name,
+    frozenset(('film', 'category')): film_category.name
+}
+
+
+def init_app(app):
+    response_cache.configure(app.config['RESPONSE_CACHE_MAX_ENTRIES'], app.config['RESPONSE_CACHE_TTL'],
+                             app.config['RESPONSE_CACHE_MAX_BYTES'])
+
+
+def cache_key():
+    """
+    :return: The path and query args of the request, ignoring the order the args were given in
+    """
+    return request.path, tuple(sorted(request.args.items(multi=True)))
+
+
+def dependencies():
+    """
+    :return: The names of the tables the response to the request is read from
+    """
+    names = request.path.strip('/').split('/') + request.args.get('include', '').split(',')
+    tables = {RESOURCE_TABLES[name] for name in names if name in RESOURCE_TABLES}
+    for name in names:
+        tables |= DERIVED_TABLES.get(name, set())
+    if 'category' in request.args.get('facets', '').split(','):
+        tables |= {'category', film_category.name}
+    for pair, link_table in LINK_TABLES.items():
+        if pair <= tables:
+            tables.add(link_table)
+    return tables
+
+
+def strong_etag(body):
+    """
+    :param body: The response body
+    :return: A strong ETag for the body
+    """
+    return hashlib.sha256(body).hexdigest()
+
+
+def cacheable():
+    # A profiled request has to actually run, and its profile is not a response to cache
+    return request.method == 'GET' and 'profiler' not in g
+
+
+def serve_cached_response():
+    """
+    Answers a GET from the response cache when the cached entry is still current
+    """
+    if not cacheable() or not current_app.config['RESPONSE_CACHE_ENABLED']:
+        return None
+
+    # The generations are read before the response is built, so a write that commits while
+    # the response is being built makes the stored entry stale rather than hiding the write
+    g.response_cache_key = cache_key()
+    g.response_generations = snapshot(dependencies())
+
+    entry = response_cache.get(g.response_cache_key)
+    if entry is None or entry["generations"] != g.response_generations:
+        return None
+
+    response = Response(entry["body"], status=200, mimetype=entry["mimetype"])
+    response.set_etag(entry["etag"])
+    g.response_cached = True
+    return response.make_conditional(request)
+
+
+def cache_response(response):
+    """
+    Adds a strong ETag to successful GET responses, stores them in the response cache when it's enabled
+    and turns them into a 304 Not Modified when the client already has them
+    """
+    if not cacheable() or response.status_code != 200 or response.is_streamed or g.get('response_cached'):
+        return response
+
+    body = response.get_data()
+    etag = strong_etag(body)
+    response.set_etag(etag)
+    if 'response_cache_key' in g:
+        response_cache.set(g.response_cache_key, {
+            "generations": g.response_generations,
+            "body": body,
+            "mimetype": response.mimetype,
+            "etag": etag
+        }, size=len(body))
+    return response.make_conditional(request)
@@ -4,13 +4,31 @@ from marshmallow import ValidationError
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm.exc import StaleDataError
 
+from api.admission import admit_request, release_request
+from api.coalesce import join_flight, share_response, end_flight
+from api.compression import compress_response
+from api.response_cache import serve_cached_response, cache_response
 from api.routes.actors import actors_router
+from api.routes.batch import batch_router
 from api.routes.categories import categories_router
 from api.routes.films import films_router
+from api.routes.stats import stats_router
 
 
 routes = Blueprint('api',__name__, url_prefix='/api')
 
+routes.before_request(serve_cached_response)
+routes.before_request(join_flight)
+# Only requests that will actually run wait for room under their route's limit, not cache hits or coalesced requests
+routes.before_request(admit_request)
+# After request functions run in reverse, so the leader of a flight shares its response before it's made conditional,
+# and the uncompressed body is what's shared and cached before each response is compressed for its own client
+routes.after_request(compress_response)
+routes.after_request(cache_response)
+routes.after_request(share_response)
+routes.teardown_request(end_flight)
+routes.teardown_request(release_request)
+
 @routes.errorhandler(ValidationError)
 def handle_validation_error(error):
     return {
@@ -43,6 +61,14 @@ def handle_generic_error(error):
         "error_type": "internal_error"
     }, 500
 
+@routes.errorhandler(503)
+def handle_unavailable_error(error):
+    return {
+        "error": "Service Unavailable",
+        "message": error.description,
+        "error_type": "unavailable_error"
+    }, 503
+
 @routes.errorhandler(400)
 def custom_error_400(msg):
     return msg, 400
@@ -81,5 +107,7 @@ def handle_value_error(error):
 routes.register_blueprint(actors_router)
 routes.register_blueprint(films_router)
 routes.register_blueprint(categories_router)
+routes.register_blueprint(batch_router)
+routes.register_blueprint(stats_router)
 
 
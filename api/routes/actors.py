@@ -1,11 +1,17 @@
 from flask import Blueprint, request
 
-from api.models import db
+from api.models import db, film_actor
 from api.models.actor import Actor
 from api.models.film import Film
-from api.routes.common_functions import paginate_args, paginate_data, filter_data
-from api.schemas.actor import actor_schema, actors_schema
+from api.graph import costar_graph
+from api.routes.common_functions import (paginate_query, filter_data, bulk_create, batch_link, change_link,
+                                        read_entity, read_linked, load_options, sparse_schema,
+                                        update_entity, delete_entity, write_values,
+                                        ListPagination, paginate_data, paginate_args, include_args, include_options)
+from api.routes.export import stream_export
+from api.schemas.actor import actor_schema, actors_schema, costars_schema
 from api.schemas.film import film_schema, films_schema
+from api.signals import entities_changed
 
 # Create a "Blueprint" or module
 actors_router = Blueprint('actors', __name__, url_prefix='/actors')
@@ -17,12 +23,24 @@ def read_all_actors():
     """
     first_name = request.args.get('first_name','')
     last_name = request.args.get('last_name', '')
-    page, per_page = paginate_args()
 
-    actors = (filter_data(Actor.query,Actor,[('first_name',first_name),('last_name',last_name)])
-              .paginate(page=page, per_page=per_page))
+    filters = [('first_name',first_name),('last_name',last_name)]
+    actors = filter_data(Actor.query,Actor,filters)
+
+    return paginate_query(actors_schema, Actor, actors, filters)
+
+@actors_router.get('/export')
+def export_actors():
+    """
+    :return: Every actor matching the request args streamed as NDJSON or CSV
+    """
+    first_name = request.args.get('first_name','')
+    last_name = request.args.get('last_name', '')
+
+    filters = [('first_name',first_name),('last_name',last_name)]
+    actors = filter_data(Actor.query,Actor,filters)
 
-    return paginate_data(actors_schema,actors)
+    return stream_export(actors_schema, Actor, actors)
 
 @actors_router.get('/<actor_id>')
 def read_actor(actor_id):
@@ -30,8 +48,7 @@ def read_actor(actor_id):
     :param actor_id: id of the actor in the database
     :return: The actor specified by the ID, or a 404 if the actor doesn't exist
     """
-    actor = Actor.query.get_or_404(actor_id)
-    return actor_schema.dump(actor)
+    return read_entity(actor_schema, Actor, actor_id)
 
 
 @actors_router.post('/')
@@ -46,21 +63,26 @@ def create_actor():
     actor = Actor(**actor_data)
     db.session.add(actor)
     db.session.commit()
+    entities_changed.send(Actor, action='create', ids=[actor.actor_id])
 
     return actor_schema.dump(actor),201
 
 
+@actors_router.post('/bulk')
+def bulk_create_actors():
+    """
+    :return: The result of creating each actor in the request's JSON list, with the created actor or its errors
+    """
+    return bulk_create(actors_schema, Actor, request.json)
+
+
 @actors_router.delete('/<actor_id>')
 def delete_actor(actor_id):
     """
     :param actor_id: The id of the actor in the database
     :return: The actor object that has been deleted, or an error message
     """
-    actor = Actor.query.get_or_404(actor_id)
-    db.session.delete(actor)
-    db.session.commit()
-
-    return actor_schema.dump(actor),200
+    return delete_entity(actor_schema, Actor, actor_id),200
 
 
 @actors_router.put('/<actor_id>')
@@ -69,16 +91,18 @@ def update_actor(actor_id):
     :param actor_id: The id of the actor in the database
     :return: The newly updated actor object, or an error message
     """
-    actor = Actor.query.get_or_404(actor_id)
-    first_name = request.json['first_name']
-    last_name = request.json['last_name']
+    values = {name: request.json[name] for name in ('first_name', 'last_name')}
+    return update_entity(actor_schema, Actor, actor_id, write_values(actor_schema, Actor, values)),200
 
-    actor.first_name = first_name
-    actor.last_name = last_name
 
-    db.session.commit()
-
-    return actor_schema.dump(actor),200
+@actors_router.patch('/<actor_id>')
+def patch_actor(actor_id):
+    """
+    :param actor_id: The id of the actor in the database
+    :return: The actor object with only the fields in the request changed, or an error message
+    """
+    values = write_values(actor_schema, Actor, request.json, partial=True)
+    return update_entity(actor_schema, Actor, actor_id, values),200
 
 
 @actors_router.get('/<actor_id>/films')
@@ -87,15 +111,31 @@ def get_films(actor_id):
     :param actor_id: The id of the actor in the database
     :return: A list of films that the actor stars in paginated, or an error message
     """
-    actor = Actor.query.get_or_404(actor_id)
     title = request.args.get('title','')
     description = request.args.get('description', '')
-    page, per_page = paginate_args()
 
-    films = (filter_data(actor.films,Film,[('title',title),('description',description)])
-             .paginate(page=page, per_page=per_page))
+    filters = [('title',title),('description',description)]
+    return read_linked(films_schema, Actor, actor_id, Film, 'films', filters)
+
+
+@actors_router.patch('/<actor_id>/films')
+def add_films(actor_id):
+    """
+    :param actor_id: The id of the actor in the database
+    :return: The ids of the films added to the actor, skipped as already linked, or missing, or an error message
+    """
+    actor = Actor.query.get_or_404(actor_id)
+    return batch_link(film_actor, actor, Film, request.json['ids'], 'add')
+
 
-    return paginate_data(films_schema, films)
+@actors_router.delete('/<actor_id>/films')
+def remove_films(actor_id):
+    """
+    :param actor_id: The id of the actor in the database
+    :return: The ids of the films removed from the actor, skipped as not linked, or missing, or an error message
+    """
+    actor = Actor.query.get_or_404(actor_id)
+    return batch_link(film_actor, actor, Film, request.json['ids'], 'remove')
 
 
 @actors_router.get('/<actor_id>/films/<film_id>')
@@ -106,8 +146,9 @@ def get_film(actor_id, film_id):
     :return: The film object that is in the actor's filmography, or an error message
     """
     actor = Actor.query.get_or_404(actor_id)
-    film = actor.films.filter_by(film_id=film_id).first_or_404()
-    return film_schema.dump(film),201
+    schema = sparse_schema(film_schema)
+    film = actor.films.options(*load_options(Film, schema)).filter_by(film_id=film_id).first_or_404()
+    return schema.dump(film),201
 
 
 @actors_router.patch('/<actor_id>/films/<film_id>')
@@ -119,8 +160,7 @@ def add_film(actor_id, film_id):
     """
     actor = Actor.query.get_or_404(actor_id)
     film = Film.query.get_or_404(film_id)
-    actor.films.append(film)
-    db.session.commit()
+    change_link(film_actor, 'add', actor.films, film, (actor.actor_id, film.film_id))
     return film_schema.dump(film),201
 
 
@@ -133,7 +173,48 @@ def delete_film(actor_id, film_id):
     """
     actor = Actor.query.get_or_404(actor_id)
     film = Film.query.get_or_404(film_id)
-    actor.films.remove(film)
-
-    db.session.commit()
+    change_link(film_actor, 'remove', actor.films, film, (actor.actor_id, film.film_id))
     return film_schema.dump(film),200
+
+
+@actors_router.get('/<actor_id>/costars')
+def get_costars(actor_id):
+    """
+    :param actor_id: The id of the actor in the database
+    :return: The actors that have starred with the actor with their number of shared films, most shared first,
+    limited to the top request arg and paginated, or an error message
+    """
+    schema = sparse_schema(costars_schema)
+    includes = include_args(Actor)
+    actor = Actor.query.get_or_404(actor_id)
+    costars = costar_graph.costars(actor.actor_id)
+    if 'top' in request.args:
+        costars = costars[:request.args.get('top', type=int)]
+    page, per_page = paginate_args()
+
+    pagination = ListPagination(page=page, per_page=per_page, max_per_page=None, items=costars)
+    shared_films = dict(pagination.items)
+    actors = Actor.query.options(*include_options(includes)).filter(Actor.actor_id.in_(shared_films)).all()
+    for costar in actors:
+        costar.shared_films = shared_films[costar.actor_id]
+    pagination.items = sorted(actors, key=lambda costar: (-costar.shared_films, costar.actor_id))
+
+    return paginate_data(schema, pagination, includes)
+
+
+@actors_router.get('/<actor_id>/path/<other_id>')
+def get_path(actor_id, other_id):
+    """
+    :param actor_id: The id of the actor to start from
+    :param other_id: The id of the actor to reach
+    :return: The degrees of separation between the actors and the actors and films on a shortest path between them,
+    or an error message
+    """
+    actor = Actor.query.get_or_404(actor_id)
+    other = Actor.query.get_or_404(other_id)
+    path = costar_graph.path(actor.actor_id, other.actor_id)
+    if path is None:
+        return {"degrees": None, "actors": [], "films": []}
+
+    actors, films = path
+    return {"degrees": len(films), "actors": actors, "films": films}
@@ -0,0 +1,58 @@
+import hmac
+
+from flask import Blueprint, current_app, request
+
+from api.admission import admission_controller
+from api.models import db
+from api.pool import pool_stats
+from api.slow_queries import slow_query_log
+
+# Create a "Blueprint" or module
+# Diagnostics of the running app, registered outside /api so its responses are never cached
+admin_router = Blueprint('admin', __name__, url_prefix='/admin')
+
+@admin_router.before_request
+def check_admin_token():
+    """
+    :return: A 401 unless the request carries the ADMIN_TOKEN as a bearer token, when one is configured
+    """
+    token = current_app.config['ADMIN_TOKEN']
+    if token is None:
+        return None
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return {
+            "error": "Unauthorized",
+            "message": "A valid admin token is required",
+            "error_type": "unauthorized_error"
+        }, 401
+
+@admin_router.get('/slow-queries')
+def read_slow_queries():
+    """
+    :return: The slow queries and N+1 patterns in the ring buffer newest first, only those of the type request arg
+    if it's used
+    """
+    findings = slow_query_log.recent(request.args.get('type'))
+    return {"data": findings, "total": len(findings)}
+
+@admin_router.delete('/slow-queries')
+def clear_slow_queries():
+    """
+    :return: An empty ring buffer, the JSONL file is left as it is
+    """
+    slow_query_log.clear()
+    return {"data": [], "total": 0}
+
+@admin_router.get('/pool')
+def read_pool_stats():
+    """
+    :return: The state of the connection pool of the primary and of each bind
+    """
+    return {"data": {key or 'primary': pool_stats(engine) for key, engine in db.engines.items()}}
+
+@admin_router.get('/admission')
+def read_admission_stats():
+    """
+    :return: The concurrency limit, running and waiting requests and average latency of each route that was requested
+    """
+    return {"data": admission_controller.stats()}
@@ -0,0 +1,220 @@
+from marshmallow import ValidationError
+from quart import Blueprint, request, abort, current_app
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
+
+from api.async_db import session
+from api.models import film_actor, film_category
+from api.models.actor import Actor
+from api.models.category import Category
+from api.models.film import Film
+from api.routes import (handle_validation_error, handle_integrity_error, handle_generic_error, custom_error_400,
+                        handle_stale_data_error, handle_key_error, handle_value_error)
+from api.routes.common_functions import (paginate_select, include_args, load_options, dump_entities, sparse_schema,
+                                        entity_id_arg)
+from api.schemas.actor import actor_schema, actors_schema
+from api.schemas.category import category_schema, categories_schema
+from api.schemas.film import film_schema, films_schema
+
+# The read routes of the async app, with the same urls and response shapes as the sync ones.
+# Writes are served by the sync app, which keeps the caches and indexes its signals update
+async_routes = Blueprint('api', __name__, url_prefix='/api')
+async_actors_router = Blueprint('actors', __name__, url_prefix='/actors')
+async_films_router = Blueprint('films', __name__, url_prefix='/films')
+async_categories_router = Blueprint('categories', __name__, url_prefix='/categories')
+
+for error, handler in ((ValidationError, handle_validation_error), (IntegrityError, handle_integrity_error),
+                       (500, handle_generic_error), (400, custom_error_400), (StaleDataError, handle_stale_data_error),
+                       (KeyError, handle_key_error), (ValueError, handle_value_error)):
+    async_routes.register_error_handler(error, handler)
+
+
+async def get_or_404(model, entity_id, options=()):
+    """
+    :param model: The database model of the entity
+    :param entity_id: The id of the entity from the url
+    :param options: Loader options for the entity
+    :return: The entity, or a 404 if it doesn't exist
+    """
+    entity = await session().get(model, entity_id_arg(entity_id), options=options)
+    if entity is None:
+        abort(404)
+    return entity
+
+
+async def read_entity(schema, model, entity_id):
+    """
+    :return: The entity with the includes and fields in the request args, or a 404 if it doesn't exist
+    """
+    includes = include_args(model, request.args)
+    schema = sparse_schema(schema, request.args)
+    entity = await get_or_404(model, entity_id, load_options(model, schema, includes))
+    return dump_entities(schema, entity, includes)
+
+
+async def read_list(schema, model, statement, filters):
+    """
+    :param filters: The arguments to filter on in [(field,value),...] form
+    :return: The entities of the statement containing the filter values, paginated
+    """
+    conditions = [getattr(model, field).contains(value) for field, value in filters if value]
+    return await paginate_select(session(), schema, model, statement.where(*conditions), request.args,
+                                 request.base_url, current_app.config['MAX_PER_PAGE'])
+
+
+async def read_linked(schema, model, statement, entity_id):
+    """
+    :return: The entity of the statement with the id, with the fields in the request args, or a 404
+    """
+    schema = sparse_schema(schema, request.args)
+    primary_key = model.__mapper__.primary_key[0]
+    statement = statement.options(*load_options(model, schema)).where(primary_key == entity_id_arg(entity_id))
+    entity = (await session().scalars(statement)).first()
+    if entity is None:
+        abort(404)
+    return schema.dump(entity)
+
+
+def actors_of(film_id):
+    return select(Actor).join(film_actor, film_actor.c.actor_id == Actor.actor_id).where(film_actor.c.film_id == film_id)
+
+
+def categories_of(film_id):
+    return (select(Category).join(film_category, film_category.c.category_id == Category.category_id)
+            .where(film_category.c.film_id == film_id))
+
+
+def films_of_actor(actor_id):
+    return select(Film).join(film_actor, film_actor.c.film_id == Film.film_id).where(film_actor.c.actor_id == actor_id)
+
+
+def films_of_category(category_id):
+    return (select(Film).join(film_category, film_category.c.film_id == Film.film_id)
+            .where(film_category.c.category_id == category_id))
+
+
+@async_actors_router.get('/')
+async def read_all_actors():
+    """
+    :return: The actors specified in the request args, or everything if no args are used, all paginated
+    """
+    filters = [('first_name', request.args.get('first_name', '')), ('last_name', request.args.get('last_name', ''))]
+    return await read_list(actors_schema, Actor, select(Actor), filters)
+
+@async_actors_router.get('/<actor_id>')
+async def read_actor(actor_id):
+    """
+    :param actor_id: id of the actor in the database
+    :return: The actor specified by the ID, or a 404 if the actor doesn't exist
+    """
+    return await read_entity(actor_schema, Actor, actor_id)
+
+@async_actors_router.get('/<actor_id>/films')
+async def get_films(actor_id):
+    """
+    :param actor_id: The id of the actor in the database
+    :return: A list of films that the actor stars in paginated, or an error message
+    """
+    actor = await get_or_404(Actor, actor_id)
+    filters = [('title', request.args.get('title', '')), ('description', request.args.get('description', ''))]
+    return await read_list(films_schema, Film, films_of_actor(actor.actor_id), filters)
+
+@async_actors_router.get('/<actor_id>/films/<film_id>')
+async def get_film(actor_id, film_id):
+    """
+    :param actor_id: The id of the actor in the database
+    :param film_id: The id of the film the actor stars in
+    :return: The film object that is in the actor's filmography, or an error message
+    """
+    actor = await get_or_404(Actor, actor_id)
+    return await read_linked(film_schema, Film, films_of_actor(actor.actor_id), film_id),201
+
+
+@async_films_router.get('/')
+async def read_all_films():
+    """
+    :return: The films specified in the request args, or everything if no args are used, all paginated
+    """
+    filters = [('title', request.args.get('title', '')), ('description', request.args.get('description', ''))]
+    return await read_list(films_schema, Film, select(Film), filters)
+
+@async_films_router.get('/<film_id>')
+async def read_film(film_id):
+    """
+    :param film_id: id of the film in the database
+    :return: The film specified by the ID, or a 404 if the film doesn't exist
+    """
+    return await read_entity(film_schema, Film, film_id)
+
+@async_films_router.get('/<film_id>/actors')
+async def get_actors(film_id):
+    """
+    :param film_id: The id of the film in the database
+    :return: A list of actors that star in the film paginated, or an error message
+    """
+    film = await get_or_404(Film, film_id)
+    filters = [('first_name', request.args.get('first_name', '')), ('last_name', request.args.get('last_name', ''))]
+    return await read_list(actors_schema, Actor, actors_of(film.film_id), filters)
+
+@async_films_router.get('/<film_id>/actors/<actor_id>')
+async def get_actor(film_id, actor_id):
+    """
+    :param film_id: The id of the film in the database
+    :param actor_id: The id of the actor starring in the film
+    :return: The actor object that stars in the film, or an error message
+    """
+    film = await get_or_404(Film, film_id)
+    return await read_linked(actor_schema, Actor, actors_of(film.film_id), actor_id),201
+
+@async_films_router.get('/<film_id>/categories')
+async def get_categories(film_id):
+    """
+    :param film_id: The id of the film in the database
+    :return: A list of categories for the film, or an error message
+    """
+    film = await get_or_404(Film, film_id)
+    filters = [('name', request.args.get('name', ''))]
+    return await read_list(categories_schema, Category, categories_of(film.film_id), filters)
+
+@async_films_router.get('/<film_id>/categories/<category_id>')
+async def get_category(film_id, category_id):
+    """
+    :param film_id: The id of the film in the database
+    :param category_id: id of the category in the database
+    :return: The category specified by the ID, or a 404 if it isn't a category of the film
+    """
+    film = await get_or_404(Film, film_id)
+    return await read_linked(category_schema, Category, categories_of(film.film_id), category_id)
+
+
+@async_categories_router.get('/')
+async def read_all_categories():
+    """
+    :return: The categories specified in the request args, or everything if no args are used, all paginated
+    """
+    filters = [('name', request.args.get('name', ''))]
+    return await read_list(categories_schema, Category, select(Category), filters)
+
+@async_categories_router.get('/<category_id>')
+async def read_category(category_id):
+    """
+    :param category_id: id of the category in the database
+    :return: The category specified by the ID, or a 404 if the category doesn't exist
+    """
+    return await read_entity(category_schema, Category, category_id)
+
+@async_categories_router.get('/<category_id>/films')
+async def read_films(category_id):
+    """
+    :param category_id: The id of the category in the database
+    :return: A list of films in the category paginated, or an error message
+    """
+    category = await get_or_404(Category, category_id)
+    filters = [('title', request.args.get('title', '')), ('description', request.args.get('description', ''))]
+    return await read_list(films_schema, Film, films_of_category(category.category_id), filters)
+
+
+async_routes.register_blueprint(async_actors_router)
+async_routes.register_blueprint(async_films_router)
+async_routes.register_blueprint(async_categories_router)
@@ -0,0 +1,68 @@
+from inspect import isgenerator
+
+from flask import Blueprint, current_app, g, request
+from marshmallow import ValidationError
+
+# Create a "Blueprint" or module
+batch_router = Blueprint('batch', __name__, url_prefix='/batch')
+
+
+def run_get(path):
+    """
+    Dispatches a GET sub-request in the current app context, so it shares the database session of the batch
+    :param path: The path and query string of the sub-request
+    :return: The status code and body of the sub-request's response
+    """
+    # g belongs to the app context, so each sub-request gets its own copy to use
+    saved = dict(g.__dict__)
+    try:
+        with current_app.test_request_context(path, method='GET', headers={'Accept': 'application/json'}):
+            response = current_app.full_dispatch_request()
+            if isgenerator(response.response):
+                response.close()
+                return 400, {
+                    "error": "Streamed Response",
+                    "message": "Streamed responses cannot be part of a batch",
+                    "error_type": "batch_error"
+                }
+            body = response.get_json(silent=True)
+            return response.status_code, body if body is not None else response.get_data(as_text=True)
+    except Exception:
+        current_app.logger.exception("Batch sub-request to %s failed", path)
+        return 500, {
+            "error": "Internal Server Error",
+            "message": "An unexpected error occurred",
+            "error_type": "internal_error"
+        }
+    finally:
+        g.__dict__.clear()
+        g.__dict__.update(saved)
+
+
+@batch_router.post('/')
+def run_batch():
+    """
+    :return: The status and body of each GET sub-request in the request's JSON list of paths, or an error message
+    """
+    paths = request.json['requests']
+    if not isinstance(paths, list) or not all(isinstance(path, str) for path in paths):
+        raise ValidationError({"requests": ["Must be a list of paths."]})
+    if len(paths) > current_app.config['BATCH_MAX_REQUESTS']:
+        raise ValidationError({"requests": [f"At most {current_app.config['BATCH_MAX_REQUESTS']} "
+                                            f"requests can be batched."]})
+
+    # Sub-requests can go to any route of the api except the batch route itself
+    prefix = request.path.rsplit('/batch', 1)[0] + '/'
+    responses = []
+    for path in paths:
+        if not path.startswith(prefix) or path.split('?')[0].rstrip('/') == request.path.rstrip('/'):
+            status, body = 400, {
+                "error": "Invalid Path",
+                "message": f"Only GET requests to {prefix} can be batched",
+                "error_type": "batch_error"
+            }
+        else:
+            status, body = run_get(path)
+        responses.append({"path": path, "status": status, "body": body})
+
+    return {"responses": responses}
@@ -1,11 +1,14 @@
 from flask import Blueprint, request
 
-from api.models import db
+from api.models import db, film_category
 from api.models.category import Category
 from api.models.film import Film
-from api.routes.common_functions import paginate_args, paginate_data, filter_data
+from api.routes.common_functions import (paginate_query, filter_data, bulk_create, batch_link, change_link,
+                                        read_entity, read_linked, update_entity, delete_entity, write_values)
+from api.routes.export import stream_export
 from api.schemas.category import category_schema, categories_schema
 from api.schemas.film import film_schema, films_schema
+from api.signals import entities_changed
 
 # Create a "Blueprint" or module
 categories_router = Blueprint('categories', __name__, url_prefix='/categories')
@@ -17,11 +20,24 @@ def read_all_categories():
     :return: The categories specified in the request args, or everything if no args are used, all paginated
     """
     name = request.args.get('name', '')
-    page, per_page = paginate_args()
 
-    categories = (filter_data(Category.query, Category, [('name', name)]).paginate(page=page, per_page=per_page))
+    filters = [('name', name)]
+    categories = filter_data(Category.query,Category,filters)
 
-    return paginate_data(categories_schema, categories)
+    return paginate_query(categories_schema, Category, categories, filters)
+
+
+@categories_router.get('/export')
+def export_categories():
+    """
+    :return: Every category matching the request args streamed as NDJSON or CSV
+    """
+    name = request.args.get('name', '')
+
+    filters = [('name', name)]
+    categories = filter_data(Category.query,Category,filters)
+
+    return stream_export(categories_schema, Category, categories)
 
 
 @categories_router.get('/<category_id>')
@@ -30,8 +46,15 @@ def read_category(category_id):
     :param category_id: id of the category in the database
     :return: The category specified by the ID, or a 404 if the actor doesn't exist
     """
-    category = Category.query.get_or_404(category_id)
-    return category_schema.dump(category)
+    return read_entity(category_schema, Category, category_id)
+
+
+@categories_router.post('/bulk')
+def bulk_create_categories():
+    """
+    :return: The result of creating each category in the request's JSON list, with the created category or its errors
+    """
+    return bulk_create(categories_schema, Category, request.json)
 
 
 @categories_router.delete('/<category_id>')
@@ -40,11 +63,7 @@ def delete_category(category_id):
     :param category_id: The id of the category in the database
     :return: The category object that has been deleted, or an error message
     """
-    category = Category.query.get_or_404(category_id)
-    db.session.delete(category)
-    db.session.commit()
-
-    return category_schema.dump(category), 200
+    return delete_entity(category_schema, Category, category_id),200
 
 
 @categories_router.post('/')
@@ -59,6 +78,7 @@ def create_category():
     category = Category(**category_data)
     db.session.add(category)
     db.session.commit()
+    entities_changed.send(Category, action='create', ids=[category.category_id])
 
     return category_schema.dump(category), 201
 
@@ -69,14 +89,18 @@ def update_category(category_id):
     :param category_id: The id of the category in the database
     :return: The newly updated category object, or an error message
     """
-    category = Category.query.get_or_404(category_id)
-    name = request.json['name']
+    values = {name: request.json[name] for name in ('name',)}
+    return update_entity(category_schema, Category, category_id, write_values(category_schema, Category, values)),200
 
-    category.name = name
-
-    db.session.commit()
 
-    return category_schema.dump(category),200
+@categories_router.patch('/<category_id>')
+def patch_category(category_id):
+    """
+    :param category_id: The id of the category in the database
+    :return: The category object with only the fields in the request changed, or an error message
+    """
+    values = write_values(category_schema, Category, request.json, partial=True)
+    return update_entity(category_schema, Category, category_id, values),200
 
 
 @categories_router.get('/<category_id>/films')
@@ -85,15 +109,31 @@ def read_films(category_id):
     :param category_id: id of the category in the database
     :return: The films that are in the specified category, or a 404 if the category doesn't exist
     """
-    category = Category.query.get_or_404(category_id)
     title = request.args.get('title', '')
     description = request.args.get('description', '')
-    page, per_page = paginate_args()
 
-    films = (filter_data(category.films, Film, [('title', title), ('description', description)])
-             .paginate(page=page, per_page=per_page))
+    filters = [('title', title), ('description', description)]
+    return read_linked(films_schema, Category, category_id, Film, 'films', filters)
+
 
-    return paginate_data(films_schema, films)
+@categories_router.patch('/<category_id>/films')
+def add_films(category_id):
+    """
+    :param category_id: The id of the category in the database
+    :return: The ids of the films added to the category, skipped as already linked, or missing, or an error message
+    """
+    category = Category.query.get_or_404(category_id)
+    return batch_link(film_category, category, Film, request.json['ids'], 'add')
+
+
+@categories_router.delete('/<category_id>/films')
+def remove_films(category_id):
+    """
+    :param category_id: The id of the category in the database
+    :return: The ids of the films removed from the category, skipped as not linked, or missing, or an error message
+    """
+    category = Category.query.get_or_404(category_id)
+    return batch_link(film_category, category, Film, request.json['ids'], 'remove')
 
 
 @categories_router.patch('/<category_id>/films/<film_id>')
@@ -105,8 +145,7 @@ def add_film(category_id, film_id):
     """
     category = Category.query.get_or_404(category_id)
     film = Film.query.get_or_404(film_id)
-    category.films.append(film)
-    db.session.commit()
+    change_link(film_category, 'add', category.films, film, (category.category_id, film.film_id))
     return film_schema.dump(film), 201
 
 
@@ -119,6 +158,5 @@ def delete_film(category_id, film_id):
     """
     category = Category.query.get_or_404(category_id)
     film = Film.query.get_or_404(film_id)
-    category.films.remove(film)
-    db.session.commit()
+    change_link(film_category, 'remove', category.films, film, (category.category_id, film.film_id))
     return film_schema.dump(film), 201
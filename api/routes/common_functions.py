@@ -1,30 +1,511 @@
-from flask import request
-from sqlalchemy import and_
+import base64
+import json
+from urllib.parse import urlencode
 
-def paginate_args():
-    return request.args.get('page', 1, type=int), request.args.get('per_page', 10, type=int)
+from flask import request, abort, current_app
+from flask_sqlalchemy.pagination import Pagination
+from marshmallow import ValidationError
+from sqlalchemy import and_, or_, func, inspect, insert, delete, select, update
+from sqlalchemy.orm import selectinload, load_only
 
-def paginate_data(schema,entities):
+from api.counts import count_entities
+from api.metrics import serialization_timer
+from api.models import db
+from api.models.actor import Actor
+from api.models.category import Category
+from api.models.film import Film
+from api.schemas.actor import actors_schema
+from api.schemas.category import categories_schema
+from api.schemas.compiled import compile_schema
+from api.schemas.film import films_schema
+from api.search import search_ids
+from api.signals import entities_changed, links_changed
+from api.snapshot import catalogue_snapshot
+
+
+# The relations that can be embedded with ?include=, as (eager loadable relationship, schema) by name
+INCLUDES = {
+    Film: {
+        'actors': (Film.actor_list, actors_schema),
+        'categories': (Film.category_list, categories_schema)
+    },
+    Actor: {
+        'films': (Actor.film_list, films_schema)
+    },
+    Category: {
+        'films': (Category.film_list, films_schema)
+    }
+}
+
+# Schemas restricted to the fields requested with ?fields=, by (schema, fields)
+_sparse_schemas = {}
+
+def paginate_args(args=None,max_per_page=None):
+    """
+    :param args: The request args, when they don't come from a Flask request
+    :param max_per_page: The largest per_page, MAX_PER_PAGE of the Flask app's config if it isn't given
+    :return: The page and per_page request args, per_page clamped to the maximum
+    """
+    args = request.args if args is None else args
+    if max_per_page is None:
+        max_per_page = current_app.config['MAX_PER_PAGE']
+    return args.get('page', 1, type=int), min(args.get('per_page', 10, type=int), max_per_page)
+
+def sparse_schema(schema,args=None):
+    """
+    :param schema: The relevant schema for the entities
+    :param args: The request args, when they don't come from a Flask request
+    :return: The schema restricted to the fields named in the fields request arg, or the schema if there are none
+    """
+    args = request.args if args is None else args
+    names = [name for name in args.get('fields', '').split(',') if name]
+    if not names:
+        return schema
+    unknown = [name for name in names if name not in schema.fields]
+    if unknown:
+        raise ValidationError({"fields": [f"Unknown field '{name}'" for name in unknown]})
+
+    key = (schema, frozenset(names))
+    if key not in _sparse_schemas:
+        _sparse_schemas[key] = type(schema)(many=schema.many, only=names)
+    return _sparse_schemas[key]
+
+def include_args(model,args=None):
+    """
+    :param model: The database model of the entities being read
+    :param args: The request args, when they don't come from a Flask request
+    :return: The relations named in the include request arg as [(name, relationship, schema),...]
+    """
+    args = request.args if args is None else args
+    names = [name for name in args.get('include', '').split(',') if name]
+    unknown = [name for name in names if name not in INCLUDES.get(model, {})]
+    if unknown:
+        raise ValidationError({"include": [f"Cannot include '{name}'" for name in unknown]})
+    return [(name, *INCLUDES[model][name]) for name in dict.fromkeys(names)]
+
+def include_options(includes):
+    """
+    :param includes: The relations to include, from include_args
+    :return: Loader options that load each relation for a whole page with one batched IN query
+    """
+    return [selectinload(relationship) for _, relationship, _ in includes]
+
+def load_options(model,schema,includes=(),columns=()):
+    """
+    :param model: The database model of the entities being read
+    :param schema: The relevant schema for the entities, possibly from sparse_schema
+    :param includes: The relations to include, from include_args
+    :param columns: Columns that must be loaded besides the schema's fields
+    :return: Loader options that eager load the includes and only load the columns the schema dumps
+    """
+    options = include_options(includes)
+    if schema.only is not None:
+        options.append(load_only(*[getattr(model, name) for name in schema.only], *columns))
+    return options
+
+def fast_serializer(schema,includes=()):
+    """
+    :param schema: The relevant many=True schema for the entities
+    :param includes: The relations to nest in each entity, from include_args
+    :return: A compiled serializer to select and dump row tuples with, or None to use the schema
+    """
+    if includes or not current_app.config['FAST_SERIALIZER']:
+        return None
+    return compile_schema(schema)
+
+def select_for(schema,model,entities,includes=(),columns=()):
+    """
+    :param schema: The relevant many=True schema for the entities, possibly from sparse_schema
+    :param model: The database model of the entities
+    :param entities: The database entities to select
+    :param includes: The relations to nest in each entity, from include_args
+    :param columns: Labelled columns that must be selected besides the schema's fields
+    :return: The schema or serializer to dump with, and the entities selecting only what it needs
+    """
+    serializer = fast_serializer(schema, includes)
+    if serializer is None:
+        return schema, entities.options(*load_options(model, schema, includes,
+                                                              [getattr(model, column.element.key) for column in columns]))
+    return serializer, entities.with_entities(*serializer.columns, *columns)
+
+def dump_entities(schema,entities,includes=()):
+    """
+    :param schema: The relevant schema for the entities
+    :param entities: The database entities, or a single entity if the schema isn't many=True
+    :param includes: The relations to nest in each entity, from include_args
+    :return: The serialized entities
+    """
+    data = schema.dump(entities)
+    if includes:
+        for entity, entity_data in zip(entities if schema.many else [entities], data if schema.many else [data]):
+            for name, relationship, nested_schema in includes:
+                entity_data[name] = nested_schema.dump(getattr(entity, relationship.key))
+    return data
+
+def paginate_data(schema,entities,includes=(),base_url=None):
     """
     :param schema: The relevant schema for the entities
     :param entities: The database entities
+    :param includes: The relations to nest in each entity, from include_args
+    :param base_url: The url of the page links, when the request isn't a Flask request
     :return: Paginated data for the entities
     """
+    base_url = base_url or request.base_url
+    with serialization_timer():
+        items = dump_entities(schema, entities.items, includes)
     data = {
-        "data": schema.dump(entities),
-        "total": entities.total,
-        "pages": entities.pages,
+        "data": items,
         "current_page": entities.page,
         "per_page": entities.per_page
     }
 
-    if entities.page < entities.pages:
-        data["next_page"] = f"{request.base_url}?page={entities.page + 1}"
+    # Without a count we can only tell there may be more pages from a full page
+    if entities.total is None:
+        has_next = len(entities.items) == entities.per_page
+    else:
+        data["total"] = entities.total
+        data["pages"] = entities.pages
+        has_next = entities.page < entities.pages
+
+    if has_next:
+        data["next_page"] = f"{base_url}?page={entities.page + 1}"
 
     if entities.page > 1:
-        data["prev_page"] = f"{request.base_url}?page={entities.page - 1}"
+        data["prev_page"] = f"{base_url}?page={entities.page - 1}"
     return data
 
+def encode_cursor(values):
+    """
+    :param values: The (sort value, primary key) of the last entity on a page
+    :return: An opaque url-safe cursor string for the values
+    """
+    return base64.urlsafe_b64encode(json.dumps(values, separators=(',', ':')).encode()).decode().rstrip('=')
+
+def cursor_value_type(column):
+    """
+    :return: The JSON types a cursor value of the column can have
+    """
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        python_type = None
+    if python_type is int:
+        types = (int,)
+    elif python_type is str:
+        types = (str,)
+    else:
+        types = (str, int, float)
+    return types + (type(None),) if column.nullable else types
+
+def decode_cursor(cursor,columns=None):
+    """
+    :param cursor: A cursor string produced by encode_cursor
+    :param columns: The (sort column, primary key) the cursor's values are compared with
+    :return: The (sort value, primary key) stored in the cursor, or None for the first page
+    """
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except ValueError:
+        abort(400, "Invalid cursor")
+    if not isinstance(values, list) or len(values) != 2:
+        abort(400, "Invalid cursor")
+    # bool is an int to isinstance but never a value of a column
+    if columns is not None and any(isinstance(value, bool) or not isinstance(value, cursor_value_type(column))
+                                   for value, column in zip(values, columns)):
+        abort(400, "Invalid cursor")
+    return values
+
+def cursor_columns(model):
+    """
+    :param model: The database model being paginated
+    :return: The sort column chosen in the request args and the primary key column of the model
+    """
+    mapper = inspect(model)
+    primary_key = mapper.primary_key[0]
+    sort = request.args.get('sort', primary_key.name)
+    if sort not in mapper.columns:
+        abort(400, f"Cannot sort by '{sort}'")
+    return mapper.columns[sort], primary_key
+
+def paginate_cursor(schema,model,entities):
+    """
+    Keyset pagination, each page is a single range scan on (sort column, primary key) with no count
+    :param schema: The relevant schema for the entities
+    :param model: The database model for the entities
+    :param entities: The database entities to paginate
+    :return: A page of data for the entities with an opaque cursor for the next page
+    """
+    per_page = paginate_args()[1]
+    if per_page < 1:
+        abort(400, "per_page must be a positive integer")
+    sort_column, primary_key = cursor_columns(model)
+    after = decode_cursor(request.args.get('cursor'), (sort_column, primary_key))
+
+    if after is not None:
+        if sort_column is primary_key:
+            entities = entities.filter(primary_key > after[1])
+        else:
+            entities = entities.filter(or_(sort_column > after[0],
+                                           and_(sort_column == after[0], primary_key > after[1])))
+
+    order = [primary_key] if sort_column is primary_key else [sort_column, primary_key]
+    includes = include_args(model)
+    cursor_values = [sort_column.label('cursor_sort'), primary_key.label('cursor_key')]
+    schema, entities = select_for(schema, model, entities, includes, cursor_values)
+    # Fetch one extra row so we know whether there is a next page without counting
+    rows = entities.order_by(None).order_by(*order).limit(per_page + 1).all()
+
+    data = {
+        "data": dump_entities(schema, rows[:per_page], includes),
+        "per_page": per_page
+    }
+
+    if len(rows) > per_page:
+        last = rows[per_page - 1]
+        # Row tuples carry the labelled cursor columns, entities have them as attributes
+        if hasattr(last, '_mapping'):
+            values = [last.cursor_sort, last.cursor_key]
+        else:
+            values = [getattr(last, sort_column.key), getattr(last, primary_key.key)]
+        data["next_cursor"] = encode_cursor(values)
+        args = request.args.to_dict()
+        args["cursor"] = data["next_cursor"]
+        data["next_page"] = f"{request.base_url}?{urlencode(args)}"
+    return data
+
+def ids_args():
+    """
+    :return: The ids in the ids request arg in the order given, without repeats
+    """
+    try:
+        ids = [int(entity_id) for entity_id in request.args['ids'].split(',') if entity_id]
+    except ValueError:
+        raise ValidationError({"ids": ["Must be a comma separated list of integers."]})
+    if len(ids) > current_app.config['MAX_IDS']:
+        raise ValidationError({"ids": [f"At most {current_app.config['MAX_IDS']} ids can be read at once."]})
+    return list(dict.fromkeys(ids))
+
+def read_ids(schema,model,entities):
+    """
+    Reads the entities with the ids in the request args with a single IN query
+    :param schema: The relevant schema for the entities
+    :param model: The database model for the entities
+    :param entities: The filtered database entities to read from
+    :return: The entities in the order their ids were given, and the ids that weren't found
+    """
+    ids = ids_args()
+    primary_key = inspect(model).primary_key[0]
+    includes = include_args(model)
+    schema, entities = select_for(schema, model, entities.filter(primary_key.in_(ids)), includes,
+                                  [primary_key.label('entity_key')])
+    rows = entities.all()
+
+    keys = [row.entity_key if hasattr(row, '_mapping') else getattr(row, primary_key.key) for row in rows]
+    by_id = dict(zip(keys, dump_entities(schema, rows, includes)))
+    return {
+        "data": [by_id[entity_id] for entity_id in ids if entity_id in by_id],
+        "missing": [entity_id for entity_id in ids if entity_id not in by_id]
+    }
+
+def count_mode(args=None):
+    """
+    :param args: The request args, when they don't come from a Flask request
+    :return: How the total should be counted from the request args, one of 'none', 'estimate' or 'exact'
+    """
+    args = request.args if args is None else args
+    mode = args.get('count', 'exact')
+    if mode not in ('none', 'estimate', 'exact'):
+        abort(400, "count must be one of none, estimate or exact")
+    return mode
+
+def paginate_query(schema,model,entities,filters=(),owner=None):
+    """
+    :param schema: The relevant schema for the entities
+    :param model: The database model for the entities
+    :param entities: The filtered database entities to paginate
+    :param filters: The arguments the entities were filtered on in [(field,value),...] form.
+    :param owner: The entity the entities are a relationship list of, or None
+    :return: The entities with the ids in the request args if there are any, keyset paginated data if a cursor
+    is in the request args, otherwise page paginated data
+    """
+    schema = sparse_schema(schema)
+    if 'ids' in request.args:
+        return read_ids(schema, model, entities)
+    if 'cursor' in request.args:
+        return paginate_cursor(schema, model, entities)
+
+    page, per_page = paginate_args()
+    includes = include_args(model)
+
+    # When every filter was answered by the search index the matching ids are already known,
+    # so the total is free and only the requested page needs to be fetched
+    ids, sql_filters = search_filters(model, filters)
+    if ids is not None and not sql_filters and owner is None:
+        schema, entities = select_for(schema, model, model.query, includes)
+        pagination = IdPagination(page=page, per_page=per_page, max_per_page=None, query=entities, model=model,
+                                  ids=ids)
+        if count_mode() == 'none':
+            pagination.total = None
+        return paginate_data(schema, pagination, includes)
+
+    total, estimated = count_entities(model, entities, filters, owner, count_mode())
+
+    schema, entities = select_for(schema, model, entities, includes)
+    pagination = entities.paginate(page=page, per_page=per_page, count=False)
+    pagination.total = total
+    data = paginate_data(schema, pagination, includes)
+    if estimated:
+        data["total_estimated"] = True
+    return data
+
+async def paginate_select(session,schema,model,statement,args,base_url,max_per_page):
+    """
+    The async app's counterpart of paginate_query, page paginates a select of the model with an async session
+    :param session: The async session of the request
+    :param schema: The relevant schema for the entities
+    :param model: The database model for the entities
+    :param statement: The filtered select of the model to paginate
+    :param args: The request args
+    :param base_url: The url of the request, for the page links
+    :param max_per_page: The largest per_page, from the async app's config
+    :return: Page paginated data for the entities, in the same shape as paginate_query's
+    """
+    # Without these the sync app answers in a different shape, so the same url must not quietly answer differently here
+    unsupported = {name: ["Not supported by the async app."] for name in ('cursor', 'ids', 'facets') if name in args}
+    if args.get('count') == 'estimate':
+        unsupported['count'] = ["Estimates are not supported by the async app."]
+    if unsupported:
+        raise ValidationError(unsupported)
+
+    schema = sparse_schema(schema, args)
+    page, per_page = paginate_args(args, max_per_page)
+    includes = include_args(model, args)
+    if page < 1 or per_page < 1:
+        abort(404)
+
+    total = None
+    if count_mode(args) != 'none':
+        total = await session.scalar(select(func.count()).select_from(statement.order_by(None).subquery()))
+
+    primary_key = inspect(model).primary_key[0]
+    statement = (statement.options(*load_options(model, schema, includes)).order_by(primary_key)
+                 .limit(per_page).offset((page - 1) * per_page))
+    items = (await session.scalars(statement)).all()
+
+    pagination = LoadedPagination(page=page, per_page=per_page, max_per_page=None, count=total is not None,
+                                  items=items, total=total)
+    return paginate_data(schema, pagination, includes, base_url)
+
+def read_entity(schema,model,entity_id):
+    """
+    :param schema: The relevant schema for the entity
+    :param model: The database model of the entity
+    :param entity_id: The id of the entity from the url
+    :return: The entity with the includes and fields in the request args, read from the catalogue snapshot in
+    snapshot mode, or a 404 if it doesn't exist
+    """
+    includes = include_args(model)
+    schema = sparse_schema(schema)
+    snapshot = catalogue_snapshot.current()
+    if snapshot is None:
+        entity = model.query.options(*load_options(model, schema, includes)).get_or_404(entity_id)
+    else:
+        entity = snapshot.entity(model, entity_id_arg(entity_id), includes)
+        if entity is None:
+            abort(404)
+    return dump_entities(schema, entity, includes)
+
+def read_linked(schema,owner_model,owner_id,model,relationship,filters):
+    """
+    :param schema: The relevant schema for the entities
+    :param owner_model: The database model of the entity owning the relationship list
+    :param owner_id: The id of the owning entity from the url
+    :param model: The database model of the entities in the list
+    :param relationship: The name of the owner's dynamic relationship to the entities
+    :param filters: The arguments to filter on in [(field,value),...] form.
+    :return: The owner's entities filtered and paginated, read from the catalogue snapshot in snapshot mode when the
+    request args can be answered from it, or a 404 if the owner doesn't exist
+    """
+    snapshot = catalogue_snapshot.current()
+    # Ids, cursors and LIKE wildcards are left to the database
+    if (snapshot is None or 'ids' in request.args or 'cursor' in request.args
+            or any('%' in value or '_' in value for _, value in filters)):
+        owner = owner_model.query.get_or_404(owner_id)
+        entities = filter_data(getattr(owner, relationship), model, filters)
+        return paginate_query(schema, model, entities, filters, owner=owner)
+
+    schema = sparse_schema(schema)
+    includes = include_args(model)
+    indexes = snapshot.linked(owner_model, entity_id_arg(owner_id), model, filters)
+    if indexes is None:
+        abort(404)
+
+    # Only the entities on the page are decoded
+    page, per_page = paginate_args()
+    pagination = ListPagination(page=page, per_page=per_page, max_per_page=None, items=indexes)
+    pagination.items = snapshot.rows(model, pagination.items, includes)
+    if count_mode() == 'none':
+        pagination.total = None
+    return paginate_data(schema, pagination, includes)
+
+class IdPagination(Pagination):
+    """
+    Paginates a known set of primary keys, fetching only the rows on the requested page
+    """
+
+    def _query_items(self):
+        model = self._query_args["model"]
+        primary_key = inspect(model).primary_key[0]
+        page_ids = sorted(self._query_args["ids"])[(self.page - 1) * self.per_page:self.page * self.per_page]
+        if not page_ids:
+            return []
+        return self._query_args["query"].filter(primary_key.in_(page_ids)).order_by(primary_key).all()
+
+    def _query_count(self):
+        return len(self._query_args["ids"])
+
+class LoadedPagination(Pagination):
+    """
+    A page of items that has already been loaded, with a total that's already been counted
+    """
+
+    def _query_items(self):
+        return self._query_args["items"]
+
+    def _query_count(self):
+        return self._query_args["total"]
+
+class ListPagination(Pagination):
+    """
+    Paginates a list that has already been computed in memory
+    """
+
+    def _query_items(self):
+        return self._query_args["items"][(self.page - 1) * self.per_page:self.page * self.per_page]
+
+    def _query_count(self):
+        return len(self._query_args["items"])
+
+def search_filters(model,args):
+    """
+    :param model: The database model for the entities
+    :param args: The arguments to filter in [(field,value),...] form.
+    :return: The set of ids matching the indexed filters (or None if there are none), and the remaining filters
+    """
+    ids = None
+    sql_filters = []
+    for field, value in args:
+        if not value:
+            continue
+        matches = search_ids(model, field, value)
+        if matches is None:
+            sql_filters.append((field, value))
+        else:
+            ids = matches if ids is None else ids & matches
+    return ids, sql_filters
+
 def filter_data(entities,model,args):
     """
     :param entities: The database entities to filter
@@ -32,4 +513,243 @@ def filter_data(entities,model,args):
     :param args: The arguments to filter in [(field,value),...] form.
     :return: The filtered entities
     """
-    return entities.filter(and_(*[getattr(model,field).contains(f"%{value}%") for field, value in args if value]))
+    ids, sql_filters = search_filters(model, args)
+    # A long IN list costs more than the LIKE it replaces, so a large match set is left to the database
+    if ids is not None and len(ids) > current_app.config['SEARCH_INDEX_MAX_IDS']:
+        ids, sql_filters = None, [(field, value) for field, value in args if value]
+    conditions = [getattr(model,field).contains(value) for field, value in sql_filters]
+    if ids is not None:
+        conditions.append(inspect(model).primary_key[0].in_(ids))
+    return entities.filter(and_(*conditions))
+
+def bulk_create(schema,model,items):
+    """
+    Validates the items with a many=True schema and inserts the valid ones with executemany in one transaction
+    :param schema: The many=True schema for the model
+    :param model: The database model to create entities of
+    :param items: The list of entity data in the request
+    :return: Per item results (with the created entity or the validation errors), and a status code
+    """
+    if not isinstance(items, list):
+        raise ValidationError("Expected a list of objects")
+
+    primary_key = inspect(model).primary_key[0]
+    returning = db.engine.dialect.insert_executemany_returning
+    chunk_size = current_app.config['BULK_CHUNK_SIZE']
+    results = []
+    created_ids = []
+    ids_known = True
+
+    for start in range(0, len(items), chunk_size):
+        chunk = items[start:start + chunk_size]
+        errors = schema.validate(chunk)
+
+        # Rows with the same keys can share one executemany
+        groups = {}
+        for index, item in enumerate(chunk):
+            if index in errors:
+                results.append({"index": start + index, "status": 400, "errors": errors[index]})
+            else:
+                results.append({"index": start + index, "status": 201, "data": item})
+                groups.setdefault(tuple(sorted(item)), []).append(results[-1])
+
+        for keys, group in groups.items():
+            rows = [result["data"] for result in group]
+            if returning:
+                statement = insert(model).returning(primary_key, sort_by_parameter_order=True)
+                for result, entity_id in zip(group, db.session.execute(statement, rows).scalars()):
+                    result["data"] = {**result["data"], primary_key.key: entity_id}
+                    created_ids.append(entity_id)
+            else:
+                db.session.execute(insert(model), rows)
+                # Without RETURNING the generated ids are only known if they were supplied
+                if primary_key.key in keys:
+                    created_ids.extend(row[primary_key.key] for row in rows)
+                else:
+                    ids_known = False
+
+    db.session.commit()
+
+    created_results = [result for result in results if result["status"] == 201]
+    for result, entity in zip(created_results, schema.dump([result["data"] for result in created_results])):
+        result["data"] = entity
+
+    created = len(created_results)
+    if created:
+        entities_changed.send(model, action='create', ids=created_ids if ids_known else None)
+
+    data = {
+        "data": results,
+        "created": created,
+        "failed": len(results) - created
+    }
+    return data, 201 if created == len(results) else 207
+
+def link_columns(table,model):
+    """
+    :param table: An association table
+    :param model: A database model the table links
+    :return: The column of the table referencing the model
+    """
+    return next(column for column in table.columns
+                if any(key.column.table is model.__table__ for key in column.foreign_keys))
+
+def batch_link(table,owner,model,ids,action):
+    """
+    Adds or removes links between the owner and many entities with one statement, skipping links that
+    already exist (or don't exist when removing) and ids that don't exist
+    :param table: The association table holding the links
+    :param owner: The entity the links belong to
+    :param model: The database model of the linked entities
+    :param ids: The ids of the entities to link to or unlink from the owner
+    :param action: 'add' or 'remove'
+    :return: The ids changed, skipped and missing
+    """
+    if not isinstance(ids, list) or not all(type(entity_id) is int for entity_id in ids):
+        raise ValidationError({"ids": ["Must be a list of integers."]})
+
+    owner_column = link_columns(table, type(owner))
+    column = link_columns(table, model)
+    owner_id = inspect(owner).identity[0]
+    primary_key = inspect(model).primary_key[0]
+
+    found = set(db.session.scalars(select(primary_key).where(primary_key.in_(ids))))
+    linked = set(db.session.scalars(select(column).where(owner_column == owner_id, column.in_(found))))
+
+    if action == 'add':
+        changed = [entity_id for entity_id in dict.fromkeys(ids) if entity_id in found and entity_id not in linked]
+        if changed:
+            db.session.execute(insert(table).values([{owner_column.key: owner_id, column.key: entity_id}
+                                                     for entity_id in changed]))
+    else:
+        changed = [entity_id for entity_id in dict.fromkeys(ids) if entity_id in linked]
+        if changed:
+            db.session.execute(delete(table).where(owner_column == owner_id, column.in_(changed)))
+    db.session.commit()
+
+    if changed:
+        # Pairs are sent in the table's column order
+        owner_first = list(table.columns).index(owner_column) < list(table.columns).index(column)
+        pairs = [(owner_id, entity_id) if owner_first else (entity_id, owner_id) for entity_id in changed]
+        links_changed.send(table, action=action, pairs=pairs)
+
+    return {
+        "added" if action == 'add' else "removed": changed,
+        "skipped": [entity_id for entity_id in dict.fromkeys(ids) if entity_id in found and entity_id not in changed],
+        "missing": [entity_id for entity_id in dict.fromkeys(ids) if entity_id not in found]
+    }
+
+def change_link(table,action,links,entity,pair):
+    """
+    Adds or removes one link in its own commit, or in the next group commit when GROUP_COMMIT_ENABLED is set,
+    returning once it's committed. A change the group commit rejects is made on its own, so it fails the same way
+    :param table: The association table holding the link
+    :param action: 'add' or 'remove'
+    :param links: The dynamic relationship of the owner the link belongs to
+    :param entity: The entity to link to or unlink from the owner
+    :param pair: The ids of the link in the table's column order
+    """
+    if current_app.config['GROUP_COMMIT_ENABLED']:
+        # The request's own transaction is ended first, on SQLite its read lock would hold up the batch's commit
+        db.session.commit()
+        if current_app.extensions['link_batcher'].submit(table, action, pair):
+            return
+
+    if action == 'add':
+        links.append(entity)
+    else:
+        links.remove(entity)
+    db.session.commit()
+    links_changed.send(table, action=action, pairs=[pair])
+
+def entity_id_arg(entity_id):
+    """
+    :param entity_id: The id of an entity from the url
+    :return: The id as an integer, or a 404 if it can't be one
+    """
+    try:
+        return int(entity_id)
+    except ValueError:
+        abort(404)
+
+def write_values(schema,model,data,partial=False):
+    """
+    :param schema: The relevant schema for the model
+    :param model: The database model being written
+    :param data: The column values in the request
+    :param partial: Whether only some of the columns are being written
+    :return: The validated column values, which can't include the primary key
+    """
+    values = schema.load(data, partial=partial)
+    primary_key = inspect(model).primary_key[0]
+    if primary_key.key in values:
+        raise ValidationError({primary_key.key: ["Cannot be changed."]})
+    if not values:
+        raise ValidationError("No fields to update")
+    return values
+
+def update_entity(schema,model,entity_id,values):
+    """
+    Updates the entity with a single UPDATE ... WHERE pk=, returning the row with RETURNING where supported
+    :param schema: The relevant schema for the model
+    :param model: The database model being updated
+    :param entity_id: The id of the entity from the url
+    :param values: The validated column values to set
+    :return: The updated entity, or a 404 if it doesn't exist
+    """
+    entity_id = entity_id_arg(entity_id)
+    table = model.__table__
+    primary_key = inspect(model).primary_key[0]
+    statement = update(table).where(primary_key == entity_id).values(**values)
+
+    if db.engine.dialect.update_returning:
+        row = db.session.execute(statement.returning(*table.columns)).first()
+        if row is None:
+            db.session.rollback()
+            abort(404)
+        entity = dict(row._mapping)
+    else:
+        # The rowcount counts matched rows, so an update that changes nothing is not a 404
+        if db.session.execute(statement).rowcount == 0:
+            db.session.rollback()
+            abort(404)
+        if all(column.key in values for column in table.columns if column is not primary_key):
+            entity = {primary_key.key: entity_id, **values}
+        else:
+            entity = dict(db.session.execute(select(*table.columns).where(primary_key == entity_id)).one()._mapping)
+
+    db.session.commit()
+    entities_changed.send(model, action='update', ids=[entity_id])
+    return schema.dump(entity)
+
+def delete_entity(schema,model,entity_id):
+    """
+    Deletes the entity and its links with DELETE ... WHERE statements, returning the row with RETURNING where supported
+    :param schema: The relevant schema for the model
+    :param model: The database model being deleted from
+    :param entity_id: The id of the entity from the url
+    :return: The deleted entity, or a 404 if it doesn't exist
+    """
+    entity_id = entity_id_arg(entity_id)
+    table = model.__table__
+    primary_key = inspect(model).primary_key[0]
+
+    # Links are removed first so foreign keys on the association tables don't block the delete
+    for link_table in db.metadata.sorted_tables:
+        if link_table is not table and any(key.column.table is table for key in link_table.foreign_keys):
+            db.session.execute(delete(link_table).where(link_columns(link_table, model) == entity_id))
+
+    statement = delete(table).where(primary_key == entity_id)
+    if db.engine.dialect.delete_returning:
+        row = db.session.execute(statement.returning(*table.columns)).first()
+    else:
+        row = db.session.execute(select(*table.columns).where(primary_key == entity_id)).first()
+        if row is not None:
+            db.session.execute(statement)
+    if row is None:
+        db.session.rollback()
+        abort(404)
+
+    db.session.commit()
+    entities_changed.send(model, action='delete', ids=[entity_id])
+    return schema.dump(dict(row._mapping))
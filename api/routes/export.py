@@ -0,0 +1,158 @@
+import csv
+import io
+
+from flask import Response, current_app, request, stream_with_context
+from marshmallow import ValidationError
+from sqlalchemy import inspect
+
+from api.routes.common_functions import include_args, sparse_schema
+from api.schemas.compiled import compile_schema
+
+EXPORT_MIMETYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv'
+}
+
+
+def row_dumper(schema, model):
+    """
+    :param schema: The relevant many=True schema for the rows
+    :param model: The database model the rows are selected from
+    :return: The columns to select, and a function serializing a batch of those rows
+    """
+    serializer = compile_schema(schema)
+    if serializer is not None:
+        return serializer.columns, serializer.dump
+    columns = [getattr(model, column.key) for column in model.__table__.columns
+               if schema.only is None or column.key in schema.only]
+    return columns, lambda rows: schema.dump([dict(zip([column.key for column in columns], row)) for row in rows])
+
+
+def export_rows(schema, model, entities, include):
+    """
+    Reads the entities in batches through a server side cursor, joining the included relation in the same query
+    :param schema: The relevant many=True schema for the entities
+    :param model: The database model for the entities
+    :param entities: The filtered database entities to export
+    :param include: The relation to join from include_args, or None
+    :return: A generator of batches of (primary key, entity data, related entity data or None)
+    """
+    batch_size = current_app.config['EXPORT_BATCH_SIZE']
+    columns, dump = row_dumper(schema, model)
+    primary_key = inspect(model).primary_key[0]
+    order = [primary_key]
+
+    if include is None:
+        related_columns, related_dump = [], None
+    else:
+        _, relationship, related_schema = include
+        related_model = relationship.property.mapper.class_
+        related_columns, related_dump = row_dumper(related_schema, related_model)
+        entities = entities.outerjoin(relationship)
+        order.append(inspect(related_model).primary_key[0])
+
+    # The primary key is selected first whatever the fields, the joined rows of an entity are grouped by it
+    rows = (entities.with_entities(primary_key.label('export_key'), *columns, *related_columns)
+            .order_by(None).order_by(*order).yield_per(batch_size))
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == batch_size:
+            yield split_rows(batch, len(columns), dump, related_dump)
+            batch = []
+    if batch:
+        yield split_rows(batch, len(columns), dump, related_dump)
+
+
+def split_rows(rows, width, dump, related_dump):
+    """
+    :param rows: A batch of joined row tuples, each starting with the entity's primary key
+    :param width: The number of columns belonging to the entity rather than the related entity
+    :param dump: Serializes the entity part of the rows
+    :param related_dump: Serializes the related part of the rows, or None if nothing was joined
+    :return: The batch as [(primary key, entity data, related entity data or None),...]
+    """
+    entities = dump([row[1:width + 1] for row in rows])
+    if related_dump is None:
+        return [(row[0], entity, None) for entity, row in zip(entities, rows)]
+    related = related_dump([row[width + 1:] for row in rows])
+    return [(row[0], entity, data if row[width + 1] is not None else None)
+            for entity, data, row in zip(entities, related, rows)]
+
+
+def json_line(data):
+    return current_app.json.dumps(data, separators=(",", ":")) + '\n'
+
+
+def ndjson_lines(batches, include):
+    """
+    :return: A generator of NDJSON text, one line per entity with the included relation nested as a list
+    """
+    if include is None:
+        for batch in batches:
+            yield ''.join(json_line(entity) for _, entity, _ in batch)
+        return
+
+    # Joined rows arrive ordered by entity, so each entity's related rows are consecutive. They're grouped by primary
+    # key, as entities with only some fields can dump the same data
+    current = None
+    for batch in batches:
+        lines = []
+        for key, entity, related in batch:
+            if current is None or current[0] != key:
+                if current is not None:
+                    lines.append(json_line({**current[1], include[0]: current[2]}))
+                current = (key, entity, [])
+            if related is not None:
+                current[2].append(related)
+        yield ''.join(lines)
+    if current is not None:
+        yield json_line({**current[1], include[0]: current[2]})
+
+
+def dump_keys(schema):
+    """
+    :param schema: A schema
+    :return: The keys of the data the schema dumps, in order
+    """
+    return [field.data_key or name for name, field in schema.dump_fields.items()]
+
+
+def csv_lines(batches, schema, include):
+    """
+    :return: A generator of CSV text, one row per entity or per link to the included relation
+    """
+    keys = dump_keys(schema)
+    related_keys = dump_keys(include[2]) if include is not None else []
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(keys + [f"{include[0]}.{key}" for key in related_keys])
+    for batch in batches:
+        for _, entity, related in batch:
+            writer.writerow([entity[key] for key in keys] + [related[key] if related else '' for key in related_keys])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def stream_export(schema, model, entities):
+    """
+    :param schema: The relevant many=True schema for the entities
+    :param model: The database model for the entities
+    :param entities: The filtered database entities to export
+    :return: A streamed NDJSON or CSV response of every entity, memory use doesn't grow with the table size
+    """
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in EXPORT_MIMETYPES:
+        raise ValidationError({"format": [f"Must be one of {', '.join(EXPORT_MIMETYPES)}."]})
+
+    includes = include_args(model)
+    if len(includes) > 1:
+        raise ValidationError({"include": ["Only one relation can be included in an export."]})
+    include = includes[0] if includes else None
+    schema = sparse_schema(schema)
+
+    batches = export_rows(schema, model, entities, include)
+    lines = ndjson_lines(batches, include) if export_format == 'ndjson' else csv_lines(batches, schema, include)
+    return Response(stream_with_context(lines), mimetype=EXPORT_MIMETYPES[export_format])
@@ -1,12 +1,20 @@
 from flask import Blueprint, request
-from api.models import db
+from marshmallow import ValidationError
+from api.models import db, film_actor, film_category
 from api.models.actor import Actor
 from api.models.category import Category
 from api.models.film import Film
-from api.routes.common_functions import paginate_args, paginate_data, filter_data
+from api.routes.common_functions import (paginate_query, filter_data, bulk_create, batch_link, change_link,
+                                        read_entity, read_linked, load_options, sparse_schema,
+                                        update_entity, delete_entity, write_values,
+                                        ListPagination, paginate_data, paginate_args, include_args, include_options)
+from api.routes.export import stream_export
 from api.schemas.category import categories_schema, category_schema
-from api.schemas.film import film_schema, films_schema
+from api.schemas.film import film_schema, films_schema, similar_films_schema
 from api.schemas.actor import actor_schema, actors_schema
+from api.signals import entities_changed
+from api.similarity import similarity_index
+from api.stats import facet_counts
 
 # Create a "Blueprint" or module
 # We can insert this into our flask app
@@ -15,16 +23,32 @@ films_router = Blueprint('films', __name__, url_prefix='/films')
 @films_router.get('/')
 def read_all_films():
     """
-    :return: The films specified in the request args, or everything if no args are used, all paginated
+    :return: The films specified in the request args, or everything if no args are used, all paginated, with the
+    counts of the facets in the facets request arg over every matching film
+    """
+    title = request.args.get('title','')
+    description = request.args.get('description', '')
+
+    filters = [('title',title),('description',description)]
+    films = filter_data(Film.query,Film,filters)
+
+    data = paginate_query(films_schema, Film, films, filters)
+    if request.args.get('facets'):
+        data["facets"] = facet_counts(films, request.args['facets'].split(','))
+    return data
+
+@films_router.get('/export')
+def export_films():
+    """
+    :return: Every film matching the request args streamed as NDJSON or CSV
     """
     title = request.args.get('title','')
     description = request.args.get('description', '')
-    page, per_page = paginate_args()
 
-    films = (filter_data(Film.query,Film,[('title',title),('description',description)])
-             .paginate(page=page, per_page=per_page))
+    filters = [('title',title),('description',description)]
+    films = filter_data(Film.query,Film,filters)
 
-    return paginate_data(films_schema, films)
+    return stream_export(films_schema, Film, films)
 
 @films_router.get('/<film_id>')
 def read_film(film_id):
@@ -32,8 +56,7 @@ def read_film(film_id):
     :param film_id: id of the film in the database
     :return: The film specified by the ID, or a 404 if the film doesn't exist
     """
-    film = Film.query.get_or_404(film_id)
-    return film_schema.dump(film)
+    return read_entity(film_schema, Film, film_id)
 
 @films_router.post('/')
 def create_film():
@@ -46,21 +69,26 @@ def create_film():
     film = Film(**film_data)
     db.session.add(film)
     db.session.commit()
+    entities_changed.send(Film, action='create', ids=[film.film_id])
 
     return film_schema.dump(film),201
 
 
+@films_router.post('/bulk')
+def bulk_create_films():
+    """
+    :return: The result of creating each film in the request's JSON list, with the created film or its errors
+    """
+    return bulk_create(films_schema, Film, request.json)
+
+
 @films_router.delete('/<film_id>')
 def delete_film(film_id):
     """
     :param film_id: The id of the film in the database
     :return: The film object that has been deleted, or an error message
     """
-    film = Film.query.get_or_404(film_id)
-    db.session.delete(film)
-    db.session.commit()
-
-    return film_schema.dump(film),200
+    return delete_entity(film_schema, Film, film_id),200
 
 
 @films_router.put('/<film_id>')
@@ -69,21 +97,18 @@ def update_film(film_id):
     :param film_id: The id of the film in the database
     :return: The newly updated film object, or an error message
     """
-    film = Film.query.get_or_404(film_id)
-
-    title = request.json['title']
-    description = request.json['description']
-    release_year = request.json['release_year']
-    length = request.json['length']
+    values = {name: request.json[name] for name in ('title', 'description', 'release_year', 'length')}
+    return update_entity(film_schema, Film, film_id, write_values(film_schema, Film, values)),200
 
-    film.title = title
-    film.description = description
-    film.release_year = release_year
-    film.length = length
-
-    db.session.commit()
 
-    return film_schema.dump(film),200
+@films_router.patch('/<film_id>')
+def patch_film(film_id):
+    """
+    :param film_id: The id of the film in the database
+    :return: The film object with only the fields in the request changed, or an error message
+    """
+    values = write_values(film_schema, Film, request.json, partial=True)
+    return update_entity(film_schema, Film, film_id, values),200
 
 
 @films_router.get('/<film_id>/actors')
@@ -92,15 +117,31 @@ def get_actors(film_id):
     :param film_id:  The id of the film in the database
     :return: A list of actors that star in the film paginated, or an error message
     """
-    film = Film.query.get_or_404(film_id)
     first_name = request.args.get('first_name','')
     last_name = request.args.get('last_name', '')
-    page, per_page = paginate_args()
 
-    actors = (filter_data(film.actors,Actor,[('first_name',first_name),('last_name',last_name)])
-              .paginate(page=page, per_page=per_page))
+    filters = [('first_name',first_name),('last_name',last_name)]
+    return read_linked(actors_schema, Film, film_id, Actor, 'actors', filters)
+
+
+@films_router.patch('/<film_id>/actors')
+def add_actors(film_id):
+    """
+    :param film_id: The id of the film in the database
+    :return: The ids of the actors added to the film, skipped as already linked, or missing, or an error message
+    """
+    film = Film.query.get_or_404(film_id)
+    return batch_link(film_actor, film, Actor, request.json['ids'], 'add')
+
 
-    return paginate_data(actors_schema,actors)
+@films_router.delete('/<film_id>/actors')
+def remove_actors(film_id):
+    """
+    :param film_id: The id of the film in the database
+    :return: The ids of the actors removed from the film, skipped as not linked, or missing, or an error message
+    """
+    film = Film.query.get_or_404(film_id)
+    return batch_link(film_actor, film, Actor, request.json['ids'], 'remove')
 
 
 @films_router.get('/<film_id>/actors/<actor_id>')
@@ -111,8 +152,9 @@ def get_actor(film_id, actor_id):
     :return: The actor object that stars in the film, or an error message
     """
     film = Film.query.get_or_404(film_id)
-    actor = film.actors.filter_by(actor_id=actor_id).first_or_404()
-    return actor_schema.dump(actor),201
+    schema = sparse_schema(actor_schema)
+    actor = film.actors.options(*load_options(Actor, schema)).filter_by(actor_id=actor_id).first_or_404()
+    return schema.dump(actor),201
 
 
 @films_router.patch('/<film_id>/actors/<actor_id>')
@@ -124,8 +166,7 @@ def add_actor(film_id, actor_id):
     """
     film = Film.query.get_or_404(film_id)
     actor = Actor.query.get_or_404(actor_id)
-    film.actors.append(actor)
-    db.session.commit()
+    change_link(film_actor, 'add', film.actors, actor, (actor.actor_id, film.film_id))
     return actor_schema.dump(actor),201
 
 
@@ -138,9 +179,7 @@ def delete_actor(film_id, actor_id):
     """
     film = Film.query.get_or_404(film_id)
     actor = Actor.query.get_or_404(actor_id)
-    film.actors.remove(actor)
-
-    db.session.commit()
+    change_link(film_actor, 'remove', film.actors, actor, (actor.actor_id, film.film_id))
     return actor_schema.dump(actor),200
 
 @films_router.get('/<film_id>/categories')
@@ -149,13 +188,30 @@ def get_categories(film_id):
     :param film_id:  The id of the film in the database
     :return: A list of categories for the film, or an error message
     """
-    film = Film.query.get_or_404(film_id)
     name = request.args.get('name','')
-    page, per_page = paginate_args()
 
-    categories = (filter_data(film.categories,Category,[('name',name)]).paginate(page=page, per_page=per_page))
+    filters = [('name',name)]
+    return read_linked(categories_schema, Film, film_id, Category, 'categories', filters)
+
 
-    return paginate_data(categories_schema, categories)
+@films_router.patch('/<film_id>/categories')
+def add_categories(film_id):
+    """
+    :param film_id: The id of the film in the database
+    :return: The ids of the categories added to the film, skipped as already linked, or missing, or an error message
+    """
+    film = Film.query.get_or_404(film_id)
+    return batch_link(film_category, film, Category, request.json['ids'], 'add')
+
+
+@films_router.delete('/<film_id>/categories')
+def remove_categories(film_id):
+    """
+    :param film_id: The id of the film in the database
+    :return: The ids of the categories removed from the film, skipped as not linked, or missing, or an error message
+    """
+    film = Film.query.get_or_404(film_id)
+    return batch_link(film_category, film, Category, request.json['ids'], 'remove')
 
 @films_router.get('/<film_id>/categories/<category_id>')
 def get_category(film_id,category_id):
@@ -165,8 +221,9 @@ def get_category(film_id,category_id):
     :return: The category specified by the ID, or a 404 if the actor doesn't exist
     """
     film = Film.query.get_or_404(film_id)
-    category = film.categories.filter_by(category_id=category_id).first_or_404()
-    return category_schema.dump(category)
+    schema = sparse_schema(category_schema)
+    category = film.categories.options(*load_options(Category, schema)).filter_by(category_id=category_id).first_or_404()
+    return schema.dump(category)
 
 @films_router.patch('/<film_id>/categories/<category_id>')
 def add_category(film_id, category_id):
@@ -177,8 +234,7 @@ def add_category(film_id, category_id):
     """
     film = Film.query.get_or_404(film_id)
     category = Category.query.get_or_404(category_id)
-    film.categories.append(category)
-    db.session.commit()
+    change_link(film_category, 'add', film.categories, category, (category.category_id, film.film_id))
     return category_schema.dump(category)
 
 @films_router.delete('/<film_id>/categories/<category_id>')
@@ -190,8 +246,37 @@ def remove_category(film_id, category_id):
     """
     film = Film.query.get_or_404(film_id)
     category = Category.query.get_or_404(category_id)
-    film.categories.remove(category)
-    db.session.commit()
+    change_link(film_category, 'remove', film.categories, category, (category.category_id, film.film_id))
     return category_schema.dump(category)
 
+@films_router.get('/<film_id>/similar')
+def get_similar(film_id):
+    """
+    :param film_id: The id of the film in the database
+    :return: The films most similar to the film by shared actors and categories with their scores, limited to the
+    top request arg and paginated, or an error message
+    """
+    schema = sparse_schema(similar_films_schema)
+    includes = include_args(Film)
+    film = Film.query.get_or_404(film_id)
+    metric = request.args.get('metric', 'jaccard')
+    if metric not in ('jaccard', 'cosine'):
+        raise ValidationError({"metric": ["Must be one of jaccard, cosine."]})
+    weights = {
+        'actor': request.args.get('actor_weight', 1.0, type=float),
+        'category': request.args.get('category_weight', 1.0, type=float)
+    }
+
+    similar = similarity_index.similar(film.film_id, weights, metric)
+    if 'top' in request.args:
+        similar = similar[:request.args.get('top', type=int)]
+    page, per_page = paginate_args()
+
+    pagination = ListPagination(page=page, per_page=per_page, max_per_page=None, items=similar)
+    scores = dict(pagination.items)
+    films = Film.query.options(*include_options(includes)).filter(Film.film_id.in_(scores)).all()
+    for similar_film in films:
+        similar_film.score = scores[similar_film.film_id]
+    pagination.items = sorted(films, key=lambda similar_film: (-similar_film.score, similar_film.film_id))
 
+    return paginate_data(schema, pagination, includes)
@@ -0,0 +1,51 @@
+from flask import Blueprint, request
+from marshmallow import ValidationError
+
+from api.models import db
+from api.models.category import Category
+from api.stats import catalogue_stats
+
+# Create a "Blueprint" or module
+# Aggregates over the catalogue, answered from in memory summaries rather than grouped queries
+stats_router = Blueprint('stats', __name__, url_prefix='/stats')
+
+@stats_router.get('/films-per-category')
+def films_per_category():
+    """
+    :return: Every category with the number of films in it
+    """
+    counts = catalogue_stats.films_per_category()
+    categories = db.session.execute(db.select(Category.category_id, Category.name)
+                                    .order_by(Category.category_id))
+    return {"data": [{"category_id": category_id, "name": name, "films": counts[category_id]}
+                     for category_id, name in categories]}
+
+@stats_router.get('/cast-sizes')
+def cast_sizes():
+    """
+    :return: The number of films with each number of actors, and the mean number of actors in a film
+    """
+    counts = catalogue_stats.cast_size_counts()
+    films = sum(counts.values())
+    actors = sum(cast_size * count for cast_size, count in counts.items())
+    return {
+        "data": [{"cast_size": cast_size, "films": counts[cast_size]} for cast_size in sorted(counts)],
+        "mean": actors / films if films else None
+    }
+
+@stats_router.get('/lengths')
+def length_histogram():
+    """
+    :return: A histogram of film lengths for each release year, with buckets as wide as the bucket request arg
+    """
+    bucket = request.args.get('bucket', 10, type=int)
+    if bucket < 1:
+        raise ValidationError({"bucket": ["Must be greater than or equal to 1."]})
+
+    years = {}
+    for (release_year, start), count in sorted(catalogue_stats.length_histogram(bucket).items()):
+        years.setdefault(release_year, []).append({"from": start, "to": start + bucket - 1, "films": count})
+    return {
+        "bucket": bucket,
+        "data": [{"release_year": release_year, "lengths": lengths} for release_year, lengths in years.items()]
+    }
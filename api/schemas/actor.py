@@ -9,6 +9,12 @@ class ActorSchema(ma.SQLAlchemyAutoSchema):
         model = Actor
 
 
+# An actor along with the number of films they have shared with another actor
+class CostarSchema(ActorSchema):
+    shared_films = ma.Integer()
+
+
 # Instantiate the schema for both a single actor and many actors
 actor_schema = ActorSchema()
 actors_schema = ActorSchema(many=True)
+costars_schema = CostarSchema(many=True)
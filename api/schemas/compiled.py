@@ -0,0 +1,56 @@
+from marshmallow import fields
+
+# How marshmallow serializes the field types we can reproduce without it
+CONVERTERS = {
+    fields.Integer: int,
+    fields.String: str,
+    fields.Float: float,
+    fields.Boolean: bool
+}
+
+_compiled = {}
+
+
+class CompiledSerializer(object):
+    """
+    Serializes row tuples into the same dicts as a many=True schema's dump, using accessors
+    worked out once per schema instead of marshmallow's per field dispatch
+    """
+
+    many = True
+
+    def __init__(self, model, schema, specs):
+        self.schema = schema
+        self.columns = [getattr(model, attribute) for _, attribute, _ in specs]
+        self._specs = [(key, converter) for key, _, converter in specs]
+
+    def dump(self, rows):
+        """
+        :param rows: Row tuples selected with the serializer's columns, in that order
+        :return: The serialized rows
+        """
+        specs = self._specs
+        return [{key: value if value is None else converter(value) for (key, converter), value in zip(specs, row)}
+                for row in rows]
+
+
+def compile_schema(schema):
+    """
+    :param schema: A many=True SQLAlchemyAutoSchema instance
+    :return: A CompiledSerializer for the schema, or None if it has fields only marshmallow can serialize
+    """
+    if schema in _compiled:
+        return _compiled[schema]
+
+    model = schema.opts.model
+    specs = []
+    for name, field in schema.dump_fields.items():
+        converter = CONVERTERS.get(type(field))
+        attribute = field.attribute or name
+        if converter is None or attribute not in model.__table__.columns:
+            specs = None
+            break
+        specs.append((field.data_key or name, attribute, converter))
+
+    _compiled[schema] = CompiledSerializer(model, schema, specs) if specs else None
+    return _compiled[schema]
@@ -8,6 +8,12 @@ class FilmSchema(ma.SQLAlchemyAutoSchema):
         model = Film
 
 
+# A film along with how similar it is to another film
+class SimilarFilmSchema(FilmSchema):
+    score = ma.Float()
+
+
 # Instantiate the schema for both a single actor and many actors
 film_schema = FilmSchema()
 films_schema = FilmSchema(many=True)
+similar_films_schema = SimilarFilmSchema(many=True)
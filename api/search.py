@@ -0,0 +1,226 @@
+import threading
+import time
+from collections import defaultdict
+from threading import RLock
+
+from flask import current_app, g
+from sqlalchemy import inspect
+
+from api.models import db, primary_reads
+from api.models.actor import Actor
+from api.models.category import Category
+from api.models.film import Film
+from api.signals import entities_changed
+
+
+class NgramIndex(object):
+    """
+    An in memory inverted index from the n-grams of text columns to the primary keys of the rows containing them.
+    Matches are case insensitive substrings, the same as the LIKE '%value%' filters it replaces.
+    Only the writes of its own process update it, so it's rebuilt once it's older than SEARCH_INDEX_MAX_AGE
+    """
+
+    def __init__(self, model, fields, n=3):
+        self.model = model
+        self.fields = fields
+        self.n = n
+        self.built = False
+        self.building = False
+        # The time.monotonic() the table was read at for the index being searched
+        self.built_at = None
+        self._texts = {field: {} for field in fields}
+        self._postings = {field: defaultdict(set) for field in fields}
+        # Bumped by each reset, so a build that started before one isn't swapped in
+        self._version = 0
+        # The ids written while a build reads the table, applied to the index once it's swapped in
+        self._pending = set()
+        self._lock = RLock()
+
+    def ngrams(self, text):
+        """
+        :param text: Lower case text
+        :return: The set of n-grams in the text
+        """
+        return {text[i:i + self.n] for i in range(len(text) - self.n + 1)}
+
+    def reset(self):
+        with self._lock:
+            self.built = False
+            self._version += 1
+            self._pending.clear()
+            self._texts = {field: {} for field in self.fields}
+            self._postings = {field: defaultdict(set) for field in self.fields}
+
+    def build(self):
+        """
+        Reads every row of the model's table into new structures without holding the lock, so searches keep
+        falling back to SQL meanwhile, then swaps them in
+        :return: False if the index was reset while the table was read, and the build was thrown away
+        """
+        with self._lock:
+            version = self._version
+            self._pending.clear()
+
+        read_at = time.monotonic()
+        texts = {field: {} for field in self.fields}
+        postings = {field: defaultdict(set) for field in self.fields}
+        with primary_reads():
+            self._add_rows(self._select(), texts, postings)
+
+        with self._lock:
+            if version != self._version:
+                return False
+            self._texts, self._postings = texts, postings
+            self.built = True
+            self.built_at = read_at
+            pending, self._pending = self._pending, set()
+            if pending:
+                self._remove(pending)
+                self._add_rows(self._select(pending), self._texts, self._postings)
+            return True
+
+    def build_in_background(self, app):
+        """
+        Starts a thread building the index unless it's being built, the index being searched is kept until it's replaced
+        :param app: The app whose database is read
+        """
+        with self._lock:
+            if self.building:
+                return
+            self.building = True
+        threading.Thread(target=self._build_in_app, args=(app,), name=f'search-index-{self.model.__tablename__}',
+                         daemon=True).start()
+
+    def _build_in_app(self, app):
+        try:
+            with app.app_context():
+                self.build()
+        except Exception:
+            # The next search starts another build
+            app.logger.exception("Building the search index of %s failed", self.model.__tablename__)
+        finally:
+            with self._lock:
+                self.building = False
+
+    def update(self, ids):
+        """
+        :param ids: The primary keys of rows that were created or updated
+        """
+        with self._lock:
+            if self.building:
+                self._pending.update(ids)
+            if self.built:
+                self._remove(ids)
+                self._add_rows(self._select(ids), self._texts, self._postings)
+
+    def remove(self, ids):
+        """
+        :param ids: The primary keys of rows to remove from the index
+        """
+        with self._lock:
+            if self.building:
+                self._pending.update(ids)
+            if self.built:
+                self._remove(ids)
+
+    def _remove(self, ids):
+        for field in self.fields:
+            texts, postings = self._texts[field], self._postings[field]
+            for entity_id in ids:
+                text = texts.pop(entity_id, None)
+                if text is None:
+                    continue
+                for gram in self.ngrams(text):
+                    postings[gram].discard(entity_id)
+                    if not postings[gram]:
+                        del postings[gram]
+
+    def search(self, field, value, max_age=None):
+        """
+        :param field: The indexed field to search
+        :param value: The substring to search for
+        :param max_age: The seconds since the table was read after which the index may miss other processes' writes
+        :return: The set of primary keys of rows whose field contains the value, or None if the index isn't built
+        or is too old
+        """
+        with self._lock:
+            if not self.built or (max_age is not None and time.monotonic() - self.built_at > max_age):
+                return None
+            value = value.lower()
+            texts = self._texts[field]
+            if len(value) < self.n:
+                return {entity_id for entity_id, text in texts.items() if value in text}
+
+            # Intersect the smallest posting lists first, then check the candidates really contain the value
+            postings = sorted((self._postings[field].get(gram, ()) for gram in self.ngrams(value)), key=len)
+            candidates = set(postings[0])
+            for posting in postings[1:]:
+                if not candidates:
+                    break
+                candidates &= posting
+            return {entity_id for entity_id in candidates if value in texts[entity_id]}
+
+    def _select(self, ids=None):
+        primary_key = inspect(self.model).primary_key[0]
+        query = db.session.query(primary_key, *[getattr(self.model, field) for field in self.fields])
+        if ids is not None:
+            query = query.filter(primary_key.in_(ids))
+        return query
+
+    def _add_rows(self, rows, texts, postings):
+        for entity_id, *values in rows:
+            for field, value in zip(self.fields, values):
+                text = (value or '').lower()
+                texts[field][entity_id] = text
+                for gram in self.ngrams(text):
+                    postings[field][gram].add(entity_id)
+
+
+search_indexes = {
+    Film: NgramIndex(Film, ['title', 'description']),
+    Actor: NgramIndex(Actor, ['first_name', 'last_name']),
+    Category: NgramIndex(Category, ['name'])
+}
+
+
+def init_app(app):
+    # Indexes are built in the background from the first search after startup, once the tables exist
+    for index in search_indexes.values():
+        index.reset()
+
+
+def search_ids(model, field, value):
+    """
+    :param model: The database model to search
+    :param field: The field of the model to search
+    :param value: The substring to search for
+    :return: The set of primary keys of matching rows, or None if the field can't be searched with an index
+    or the index is still being built or too old
+    """
+    index = search_indexes.get(model)
+    # LIKE wildcards in the value can't be answered by the index
+    if (not current_app.config['SEARCH_INDEX_ENABLED'] or index is None or field not in index.fields
+            or '%' in value or '_' in value):
+        return None
+
+    searches = g.setdefault('searches', {})
+    key = (model, field, value)
+    if key not in searches:
+        searches[key] = index.search(field, value, current_app.config['SEARCH_INDEX_MAX_AGE'])
+        if searches[key] is None:
+            # Built for the first time, again after a reset or a failed build, or to catch up with other processes
+            index.build_in_background(current_app._get_current_object())
+    return searches[key]
+
+
+@entities_changed.connect
+def update_search_index(model, action, ids, **kwargs):
+    index = search_indexes.get(model)
+    if index is None:
+        return
+    if ids is None:
+        index.reset()
+    elif action == 'delete':
+        index.remove(ids)
+    else:
+        index.update(ids)
@@ -0,0 +1,12 @@
+from blinker import Namespace
+
+api_signals = Namespace()
+
+# Sent after rows of a model have been committed, the sender is the model class.
+# Receivers get action ('create', 'update' or 'delete') and ids (a list of primary keys,
+# or None when the rows written aren't known)
+entities_changed = api_signals.signal('entities-changed')
+
+# Sent after links in an association table have been committed, the sender is the table.
+# Receivers get action ('add' or 'remove') and pairs (a list of tuples in the table's column order)
+links_changed = api_signals.signal('links-changed')
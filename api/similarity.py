@@ -0,0 +1,257 @@
+import time
+from collections import Counter, defaultdict
+from math import sqrt
+from threading import RLock
+
+from flask import current_app
+from sqlalchemy import select
+
+from api.models import db, film_actor, film_category, primary_reads
+from api.models.actor import Actor
+from api.models.category import Category
+from api.models.film import Film
+from api.signals import entities_changed, links_changed
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# The association tables films are compared over, by the name used for their weight
+FEATURE_TABLES = {
+    'actor': film_actor,
+    'category': film_category
+}
+
+
+class FeatureIndex(object):
+    """
+    The film x feature incidence of one association table, held as an inverted CSR index from each
+    feature to the films that have it, plus the number of features of every film
+    """
+
+    def __init__(self, film_index, links):
+        """
+        :param film_index: The position of every film id in the film arrays
+        :param links: The feature ids of each film id
+        """
+        pairs = sorted((feature_id, film_index[film_id]) for film_id, features in links.items()
+                       for feature_id in features if film_id in film_index)
+        self.positions = {}
+        offsets, films = [0], []
+        for feature_id, position in pairs:
+            if feature_id not in self.positions:
+                if films:
+                    offsets.append(len(films))
+                self.positions[feature_id] = len(offsets) - 1
+            films.append(position)
+        offsets.append(len(films))
+
+        sizes = [0] * len(film_index)
+        for _, position in pairs:
+            sizes[position] += 1
+
+        if np is not None:
+            self.offsets, self.films, self.sizes = np.array(offsets), np.array(films, dtype=np.int64), np.array(sizes)
+        else:
+            self.offsets, self.films, self.sizes = offsets, films, sizes
+
+    def films_with(self, feature_ids):
+        """
+        :param feature_ids: Feature ids
+        :return: The film positions having each of the features, concatenated
+        """
+        slices = [self.films[self.offsets[i]:self.offsets[i + 1]]
+                  for i in (self.positions[feature_id] for feature_id in feature_ids if feature_id in self.positions)]
+        if np is not None:
+            return np.concatenate(slices) if slices else np.zeros(0, dtype=np.int64)
+        return [position for films in slices for position in films]
+
+
+def feature_similarity(features, other, metric):
+    """
+    :param features: The feature ids of one film
+    :param other: The feature ids of another film
+    :param metric: 'jaccard' or 'cosine'
+    :return: The similarity of the two sets, the same as the FeatureIndex scores
+    """
+    overlap = len(features & other)
+    if not overlap:
+        return 0
+    if metric == 'cosine':
+        return overlap / sqrt(len(features) * len(other))
+    return overlap / (len(features) + len(other) - overlap)
+
+
+class SimilarityIndex(object):
+    """
+    Scores every film against one film by the weighted Jaccard or cosine similarity of their actors and categories.
+    The FeatureIndexes are compiled once, the films changed since then are scored from their links instead
+    until there are more than SIMILARITY_RECOMPILE_THRESHOLD of them. Only the writes of its own process are applied,
+    so the index is rebuilt on the first read once it's older than SIMILARITY_MAX_AGE
+    """
+
+    def __init__(self):
+        self._lock = RLock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.built = False
+            self.built_at = None
+            self.links = {name: defaultdict(set) for name in FEATURE_TABLES}
+            self.film_ids = set()
+            self._compiled = None
+            self._changed = set()
+
+    def build(self):
+        """
+        Reads every film and every link of the feature tables
+        """
+        with self._lock, primary_reads():
+            self.reset()
+            read_at = time.monotonic()
+            self.film_ids = set(db.session.scalars(select(Film.film_id)))
+            for name, table in FEATURE_TABLES.items():
+                feature_column = next(column for column in table.primary_key.columns if column.name != 'film_id')
+                for feature_id, film_id in db.session.execute(select(feature_column, table.c.film_id)):
+                    self.links[name][film_id].add(feature_id)
+            self.built = True
+            self.built_at = read_at
+
+    def compiled(self):
+        """
+        :return: The sorted film ids and a FeatureIndex per feature table, compiled when built and once the
+        changed films overflow
+        """
+        with self._lock:
+            max_age = current_app.config['SIMILARITY_MAX_AGE']
+            if not self.built or (max_age is not None and time.monotonic() - self.built_at > max_age):
+                self.build()
+            if self._compiled is None:
+                film_ids = sorted(self.film_ids)
+                film_index = {film_id: position for position, film_id in enumerate(film_ids)}
+                self._compiled = film_ids, {name: FeatureIndex(film_index, links) for name, links in self.links.items()}
+                self._changed = set()
+            return self._compiled
+
+    def update_links(self, name, action, pairs):
+        """
+        :param name: The name of the feature table the links changed in
+        :param action: 'add' or 'remove'
+        :param pairs: The (feature id, film id) pairs that changed
+        """
+        with self._lock:
+            if not self.built:
+                return
+            for feature_id, film_id in pairs:
+                if action == 'add':
+                    self.links[name][film_id].add(feature_id)
+                else:
+                    self.links[name][film_id].discard(feature_id)
+                self._changed.add(film_id)
+            self._check_overlay()
+
+    def update_films(self, action, ids):
+        """
+        :param action: 'create' or 'delete'
+        :param ids: The ids of the films created or deleted
+        """
+        with self._lock:
+            if not self.built:
+                return
+            for film_id in ids:
+                if action == 'create':
+                    self.film_ids.add(film_id)
+                else:
+                    self.film_ids.discard(film_id)
+                    for links in self.links.values():
+                        links.pop(film_id, None)
+                self._changed.add(film_id)
+            self._check_overlay()
+
+    def similar(self, film_id, weights, metric='jaccard'):
+        """
+        :param film_id: The id of the film to compare against
+        :param weights: The weight of each feature table by name
+        :param metric: 'jaccard' or 'cosine'
+        :return: [(film id, score),...] of every other film with a score above zero, highest first
+        """
+        with self._lock:
+            film_ids, indexes = self.compiled()
+            features = {name: set(self.links[name].get(film_id, ())) for name in indexes}
+            # The compiled scores of these films are stale, they are scored from their current links below
+            changed = {changed_id: {name: set(self.links[name].get(changed_id, ())) for name in indexes}
+                       for changed_id in self._changed}
+            film_exists = {changed_id: changed_id in self.film_ids for changed_id in changed}
+        total_weight = sum(weights.values()) or 1
+
+        if np is not None:
+            scores = np.zeros(len(film_ids))
+            for name, index in indexes.items():
+                if not features[name] or not weights.get(name):
+                    continue
+                overlap = np.bincount(index.films_with(features[name]), minlength=len(film_ids))
+                size = len(features[name])
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    if metric == 'cosine':
+                        similarity = overlap / np.sqrt(size * index.sizes)
+                    else:
+                        similarity = overlap / (size + index.sizes - overlap)
+                scores += weights[name] * np.nan_to_num(similarity)
+            scores /= total_weight
+            positions = np.flatnonzero(scores > 0)
+            ranked = [(film_ids[position], float(scores[position])) for position in positions]
+        else:
+            scores = Counter()
+            for name, index in indexes.items():
+                if not features[name] or not weights.get(name):
+                    continue
+                size = len(features[name])
+                for position, overlap in Counter(index.films_with(features[name])).items():
+                    if metric == 'cosine':
+                        similarity = overlap / sqrt(size * index.sizes[position])
+                    else:
+                        similarity = overlap / (size + index.sizes[position] - overlap)
+                    scores[position] += weights[name] * similarity / total_weight
+            ranked = [(film_ids[position], score) for position, score in scores.items() if score > 0]
+
+        ranked = [item for item in ranked if item[0] not in changed]
+        for changed_id, changed_features in changed.items():
+            if not film_exists[changed_id]:
+                continue
+            score = sum(weights[name] * feature_similarity(features[name], changed_features[name], metric)
+                        for name in indexes if weights.get(name)) / total_weight
+            if score > 0:
+                ranked.append((changed_id, score))
+
+        return sorted([item for item in ranked if item[0] != film_id], key=lambda item: (-item[1], item[0]))
+
+    def _check_overlay(self):
+        # Scoring the changed films one by one costs more than recompiling once there are enough of them
+        if len(self._changed) > current_app.config['SIMILARITY_RECOMPILE_THRESHOLD']:
+            self._compiled = None
+
+
+similarity_index = SimilarityIndex()
+
+
+def init_app(app):
+    # The index is built from the database on the first read after startup
+    similarity_index.reset()
+
+
+@links_changed.connect
+def update_similarity_links(table, action, pairs, **kwargs):
+    name = next((name for name, feature_table in FEATURE_TABLES.items() if feature_table is table), None)
+    if name is not None:
+        similarity_index.update_links(name, action, pairs)
+
+
+@entities_changed.connect
+def update_similarity_entities(model, action, ids, **kwargs):
+    if model is Film and ids is not None and action != 'update':
+        similarity_index.update_films(action, ids)
+    elif (model is Film and action == 'create') or (model in (Actor, Category) and action == 'delete'):
+        # Films with unknown ids, or an actor or category whose links spanned many films
+        similarity_index.reset()
@@ -0,0 +1,174 @@
+import json
+import re
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime, timezone
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# The statement that shows the plan of a query on each database
+EXPLAIN_PREFIXES = {
+    'mysql': 'EXPLAIN ',
+    'postgresql': 'EXPLAIN ',
+    'sqlite': 'EXPLAIN QUERY PLAN '
+}
+
+# Runs of placeholders in IN lists, which vary in length between statements of the same shape
+PLACEHOLDER_LIST = re.compile(r'\(\s*(?:\?|%s|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%s|%\(\w+\)s|:\w+))*\s*\)')
+
+
+class SlowQueryLog(object):
+    """
+    A bounded ring buffer of slow queries and N+1 patterns, also appended to a JSONL file
+    """
+
+    def __init__(self, size=1000):
+        self._lock = threading.Lock()
+        self.findings = deque(maxlen=size)
+        self.path = None
+
+    def configure(self, size, path):
+        with self._lock:
+            self.findings = deque(self.findings, maxlen=size)
+            self.path = path
+
+    def record(self, finding):
+        with self._lock:
+            self.findings.append(finding)
+            if self.path:
+                with open(self.path, 'a') as log_file:
+                    log_file.write(json.dumps(finding, default=str) + '\n')
+
+    def recent(self, kind=None):
+        """
+        :param kind: Only the findings of this type, slow_query or n_plus_one
+        :return: The findings in the buffer, newest first
+        """
+        with self._lock:
+            findings = list(self.findings)
+        return [finding for finding in reversed(findings) if kind is None or finding['type'] == kind]
+
+    def clear(self):
+        with self._lock:
+            self.findings.clear()
+
+
+slow_query_log = SlowQueryLog()
+
+
+def init_app(app):
+    slow_query_log.clear()
+    slow_query_log.configure(app.config['SLOW_QUERY_LOG_SIZE'], app.config['SLOW_QUERY_LOG_FILE'])
+    if not app.config['SLOW_QUERY_LOG_ENABLED']:
+        return
+
+    app.before_request(start_request)
+    app.after_request(check_statement_shapes)
+
+
+def logging_enabled():
+    return has_request_context() and current_app.config['SLOW_QUERY_LOG_ENABLED']
+
+
+def statement_shape(statement):
+    """
+    :param statement: The SQL of a statement
+    :return: The statement with its whitespace and IN lists collapsed, equal for statements that only differ by values
+    """
+    return PLACEHOLDER_LIST.sub('(?)', ' '.join(statement.split()))
+
+
+def request_details():
+    return {
+        "time": datetime.now(timezone.utc).isoformat(),
+        "method": request.method,
+        "route": request.endpoint,
+        "path": request.full_path.rstrip('?')
+    }
+
+
+def explain(conn, cursor, statement, parameters):
+    """
+    Captures the plan on the connection that ran the statement, so a slow query under a saturated pool doesn't wait
+    for a second connection. The plan is read through its own DBAPI cursor, which doesn't fire engine events
+    :param conn: The connection that ran the statement
+    :param cursor: The cursor the statement ran on, its results may not have been fetched yet
+    :param statement: The SQL of a slow statement
+    :param parameters: The parameters the statement ran with
+    :return: The rows of the plan of the statement, or the error from trying to get them
+    """
+    prefix = EXPLAIN_PREFIXES.get(conn.dialect.name)
+    if prefix is None or not statement.lstrip().upper().startswith('SELECT'):
+        return {"plan": None}
+
+    # A failed statement aborts a PostgreSQL transaction, so the EXPLAIN is wrapped in a savepoint it's rolled back to
+    savepoint = conn.dialect.name == 'postgresql'
+    explain_cursor = cursor.connection.cursor()
+    try:
+        if savepoint:
+            explain_cursor.execute('SAVEPOINT slow_query_explain')
+        explain_cursor.execute(prefix + statement, parameters)
+        rows = explain_cursor.fetchall()
+        if savepoint:
+            explain_cursor.execute('RELEASE SAVEPOINT slow_query_explain')
+        return {"plan": [[str(value) for value in row] for row in rows]}
+    except Exception as error:
+        if savepoint:
+            explain_cursor.execute('ROLLBACK TO SAVEPOINT slow_query_explain')
+        return {"plan": None, "explain_error": str(error)}
+    finally:
+        explain_cursor.close()
+
+
+def start_request():
+    g.statement_shapes = Counter()
+
+
+def check_statement_shapes(response):
+    """
+    Records the statements the request ran more times than the N+1 threshold
+    """
+    threshold = current_app.config['N_PLUS_ONE_THRESHOLD']
+    for shape, count in g.get('statement_shapes', Counter()).items():
+        if count > threshold:
+            slow_query_log.record({"type": "n_plus_one", **request_details(), "statement": shape, "count": count})
+    return response
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_statement(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('slow_query_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def check_statement(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - conn.info['slow_query_start'].pop()
+    if not logging_enabled():
+        return
+
+    if 'statement_shapes' in g:
+        g.statement_shapes[statement_shape(statement)] += 1
+
+    if duration >= current_app.config['SLOW_QUERY_THRESHOLD']:
+        finding = {
+            "type": "slow_query",
+            **request_details(),
+            "statement": statement,
+            "parameters": repr(parameters),
+            "duration": duration
+        }
+        # The connection of a streamed result is busy with it until it's read to the end
+        if current_app.config['SLOW_QUERY_EXPLAIN'] and not executemany \
+                and not context.execution_options.get('stream_results'):
+            finding.update(explain(conn, cursor, statement, parameters))
+        slow_query_log.record(finding)
+
+
+@event.listens_for(Engine, 'handle_error')
+def discard_statement(context):
+    # A statement that failed never reaches after_cursor_execute
+    if context.connection is not None and context.connection.info.get('slow_query_start'):
+        context.connection.info['slow_query_start'].pop()
@@ -0,0 +1,337 @@
+import mmap
+import os
+import struct
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from itertools import accumulate
+from types import SimpleNamespace
+
+from flask import current_app
+from sqlalchemy import Integer, inspect, select
+
+from api.models import db, film_actor, film_category, primary_reads
+from api.models.actor import Actor
+from api.models.category import Category
+from api.models.film import Film
+from api.signals import entities_changed, links_changed
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+MAGIC = b'CATSNAP1'
+# Magic, version, time the snapshot was built and the number of sections
+HEADER = struct.Struct('<8sQdI')
+# Name, offset and length of each section, after the header
+SECTION = struct.Struct('<48sQQ')
+
+SNAPSHOT_MODELS = (Film, Actor, Category)
+LINK_TABLES = (film_actor, film_category)
+
+
+def link_column(table, model):
+    """
+    :return: The column of the association table referencing the model, or None if it doesn't link the model
+    """
+    return next((column for column in table.columns
+                 if any(key.column.table is model.__table__ for key in column.foreign_keys)), None)
+
+
+def write_snapshot(path, version):
+    """
+    Exports every row of the snapshot models and every link into a new column oriented file, then swaps it in
+    place of the old one so readers only ever see a complete snapshot.
+    Integer columns are int64 arrays, text columns are an int64 array of offsets into the utf-8 data, and the links
+    of each side of an association table are CSR offsets by row of that side's table into an int64 array of ids
+    :param path: The path of the snapshot file
+    :param version: The version to write in the header
+    """
+    sections = {}
+    row_ids = {}
+    with primary_reads():
+        for model in SNAPSHOT_MODELS:
+            table = model.__table__
+            primary_key = inspect(model).primary_key[0]
+            rows = db.session.execute(select(*table.columns).order_by(primary_key)).all()
+            row_ids[model] = [row._mapping[primary_key] for row in rows]
+            for index, column in enumerate(table.columns):
+                values = [row[index] for row in rows]
+                if isinstance(column.type, Integer):
+                    sections[f'{table.name}.{column.key}'] = array('q', values).tobytes()
+                else:
+                    encoded = [value.encode() for value in values]
+                    sections[f'{table.name}.{column.key}.offsets'] = \
+                        array('q', accumulate(map(len, encoded), initial=0)).tobytes()
+                    sections[f'{table.name}.{column.key}.data'] = b''.join(encoded)
+
+        for table in LINK_TABLES:
+            for owner in SNAPSHOT_MODELS:
+                owner_column = link_column(table, owner)
+                if owner_column is None:
+                    continue
+                other_column = next(column for column in table.primary_key.columns if column is not owner_column)
+                pairs = db.session.execute(select(owner_column, other_column)
+                                           .order_by(owner_column, other_column)).all()
+                counts = dict.fromkeys(row_ids[owner], 0)
+                for owner_id, _ in pairs:
+                    if owner_id in counts:
+                        counts[owner_id] += 1
+                sections[f'{table.name}.{owner.__tablename__}.offsets'] = \
+                    array('q', accumulate(counts.values(), initial=0)).tobytes()
+                sections[f'{table.name}.{owner.__tablename__}.ids'] = \
+                    array('q', [other_id for owner_id, other_id in pairs if owner_id in counts]).tobytes()
+
+    # Sections start on 8 byte boundaries so the integer arrays can be cast in place
+    offset = HEADER.size + SECTION.size * len(sections)
+    directory = []
+    for name, data in sections.items():
+        offset += -offset % 8
+        directory.append(SECTION.pack(name.encode(), offset, len(data)))
+        offset += len(data)
+
+    temporary_path = f'{path}.{os.getpid()}.tmp'
+    with open(temporary_path, 'wb') as snapshot_file:
+        snapshot_file.write(HEADER.pack(MAGIC, version, time.time(), len(sections)))
+        snapshot_file.write(b''.join(directory))
+        for data in sections.values():
+            snapshot_file.write(b'\0' * (-snapshot_file.tell() % 8))
+            snapshot_file.write(data)
+        snapshot_file.flush()
+        os.fsync(snapshot_file.fileno())
+    os.replace(temporary_path, path)
+
+
+class Snapshot(object):
+    """
+    A snapshot file mapped read only, rows are only decoded when they're read
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as snapshot_file:
+            stat = os.fstat(snapshot_file.fileno())
+            self._mmap = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.identity = (stat.st_ino, stat.st_mtime_ns)
+
+        buffer = memoryview(self._mmap)
+        magic, self.version, self.built_at, count = HEADER.unpack_from(buffer)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a catalogue snapshot")
+        self._sections = {}
+        for index in range(count):
+            name, offset, length = SECTION.unpack_from(buffer, HEADER.size + SECTION.size * index)
+            section = buffer[offset:offset + length]
+            name = name.rstrip(b'\0').decode()
+            self._sections[name] = section if name.endswith('.data') else section.cast('q')
+
+    def _index(self, model, entity_id):
+        ids = self._sections[f'{model.__tablename__}.{inspect(model).primary_key[0].key}']
+        index = bisect_left(ids, entity_id)
+        return index if index < len(ids) and ids[index] == entity_id else None
+
+    def _row(self, model, index, includes=()):
+        table = model.__table__
+        values = {}
+        for column in table.columns:
+            if isinstance(column.type, Integer):
+                values[column.key] = self._sections[f'{table.name}.{column.key}'][index]
+            else:
+                offsets = self._sections[f'{table.name}.{column.key}.offsets']
+                data = self._sections[f'{table.name}.{column.key}.data']
+                values[column.key] = bytes(data[offsets[index]:offsets[index + 1]]).decode()
+        for _, relationship, _ in includes:
+            values[relationship.key] = self._linked_rows(model, index, relationship.property.mapper.class_)
+        return SimpleNamespace(**values)
+
+    def _value(self, model, column_key, index):
+        table = model.__table__
+        if isinstance(table.columns[column_key].type, Integer):
+            return self._sections[f'{table.name}.{column_key}'][index]
+        offsets = self._sections[f'{table.name}.{column_key}.offsets']
+        data = self._sections[f'{table.name}.{column_key}.data']
+        return bytes(data[offsets[index]:offsets[index + 1]]).decode()
+
+    def _linked_indexes(self, owner, index, model):
+        table = next(table for table in LINK_TABLES
+                     if link_column(table, owner) is not None and link_column(table, model) is not None)
+        offsets = self._sections[f'{table.name}.{owner.__tablename__}.offsets']
+        ids = self._sections[f'{table.name}.{owner.__tablename__}.ids']
+        indexes = (self._index(model, entity_id) for entity_id in ids[offsets[index]:offsets[index + 1]])
+        return [entity_index for entity_index in indexes if entity_index is not None]
+
+    def _linked_rows(self, owner, index, model, includes=()):
+        return [self._row(model, entity_index, includes) for entity_index in self._linked_indexes(owner, index, model)]
+
+    def entity(self, model, entity_id, includes=()):
+        """
+        :param model: The database model of the entity
+        :param entity_id: The primary key of the entity
+        :param includes: The relations to load with the entity, from include_args
+        :return: The entity with its columns and included relations as attributes, or None if it doesn't exist
+        """
+        index = self._index(model, entity_id)
+        return None if index is None else self._row(model, index, includes)
+
+    def linked(self, owner, owner_id, model, filters=()):
+        """
+        Finds the entities linked to the owner without decoding them, only the filtered columns are read
+        :param owner: The database model of the entity owning the relationship list
+        :param owner_id: The primary key of the owning entity
+        :param model: The database model of the entities in the list
+        :param filters: Case insensitive substrings to match in [(field,value),...] form, the same as the LIKE filters
+        :return: The row indexes of the linked entities in primary key order, for rows(), or None if the owner doesn't
+        exist
+        """
+        index = self._index(owner, owner_id)
+        if index is None:
+            return None
+        indexes = self._linked_indexes(owner, index, model)
+        for field, value in filters:
+            if value:
+                indexes = [entity_index for entity_index in indexes
+                           if value.lower() in self._value(model, field, entity_index).lower()]
+        return indexes
+
+    def rows(self, model, indexes, includes=()):
+        """
+        :param model: The database model of the entities
+        :param indexes: Row indexes from linked()
+        :param includes: The relations to load with each entity, from include_args
+        :return: The entities at the indexes with their columns and included relations as attributes
+        """
+        return [self._row(model, index, includes) for index in indexes]
+
+
+class CatalogueSnapshot(object):
+    """
+    The snapshot shared by every worker process through one file. Each worker maps the current file and maps the
+    new one once a rebuild has replaced it. Writes rebuild the file in the background, a burst of them once, and
+    until a rebuild that started after a worker's last write has finished that worker reads from the database
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        # Held while this process writes a snapshot, apart from _lock so reads never wait on a rebuild
+        self._write_lock = threading.Lock()
+        self._timer = None
+        self.snapshot = None
+        # The count of writes in this process, and the count the latest rebuild includes
+        self.requested = 0
+        self.written = 0
+
+    def reset(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = None
+            self.snapshot = None
+            self.requested = self.written = 0
+
+    def refresh(self, stale_before=None):
+        """
+        Writes a new snapshot, holding a lock on the file so snapshots written by different processes are written
+        one after the other and the last one replaced includes every committed write
+        :param stale_before: Only write a snapshot if the current file was built before this time
+        """
+        path = current_app.config['SNAPSHOT_PATH']
+        with self._write_lock, open(f'{path}.lock', 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                current = Snapshot(path) if os.path.exists(path) else None
+                if stale_before is not None and current is not None and current.built_at >= stale_before:
+                    return
+                write_snapshot(path, current.version + 1 if current is not None else 1)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def schedule_refresh(self, app, stale_before=None, write=True):
+        """
+        Rebuilds the snapshot on a background thread SNAPSHOT_REFRESH_DELAY seconds from now, unless a rebuild is
+        already waiting to start, which then includes this change
+        :param app: The app whose database and config the rebuild uses
+        :param stale_before: Only rebuild if the current file was built before this time
+        :param write: Whether a write in this process is the reason, so reads skip the snapshot until it's rebuilt
+        """
+        with self._lock:
+            if write:
+                self.requested += 1
+            if self._timer is None:
+                self._timer = threading.Timer(app.config['SNAPSHOT_REFRESH_DELAY'], self._refresh_in_background,
+                                              (app, stale_before))
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _refresh_in_background(self, app, stale_before):
+        with self._lock:
+            self._timer = None
+            requested = self.requested
+        try:
+            with app.app_context():
+                self.refresh(None if requested > self.written else stale_before)
+        except Exception:
+            # Reads stay on the database until the next write schedules another rebuild
+            app.logger.exception("Rebuilding the catalogue snapshot failed")
+            return
+        with self._lock:
+            self.written = max(self.written, requested)
+
+    def current(self):
+        """
+        :return: The latest snapshot, or None when snapshot mode is off or this process wrote since it was built
+        """
+        if not current_app.config['SNAPSHOT_ENABLED']:
+            return None
+        with self._lock:
+            if self.written < self.requested:
+                return None
+
+        # The first read of the first worker builds the snapshot, the others wait on the file lock and find it built
+        if not os.path.exists(current_app.config['SNAPSHOT_PATH']):
+            self.refresh(stale_before=float('-inf'))
+        with self._lock:
+            self._attach()
+            snapshot = self.snapshot
+
+        # Whichever worker first finds the snapshot too old rebuilds it, while reads carry on from the old one
+        stale_before = time.time() - current_app.config['SNAPSHOT_REFRESH_INTERVAL']
+        if snapshot.built_at < stale_before:
+            self.schedule_refresh(current_app._get_current_object(), stale_before, write=False)
+        return snapshot
+
+    def _attach(self):
+        """
+        Maps the snapshot file, unless it's the file already mapped
+        """
+        path = current_app.config['SNAPSHOT_PATH']
+        stat = os.stat(path)
+        if self.snapshot is None or self.snapshot.identity != (stat.st_ino, stat.st_mtime_ns):
+            self.snapshot = Snapshot(path)
+
+
+catalogue_snapshot = CatalogueSnapshot()
+
+
+def init_app(app):
+    # Each worker maps the file on its first read
+    catalogue_snapshot.reset()
+
+
+def refresh_after_write():
+    if current_app.config['SNAPSHOT_ENABLED']:
+        catalogue_snapshot.schedule_refresh(current_app._get_current_object())
+
+
+@entities_changed.connect
+def refresh_snapshot_entities(model, action, ids, **kwargs):
+    if model in SNAPSHOT_MODELS:
+        refresh_after_write()
+
+
+@links_changed.connect
+def refresh_snapshot_links(table, action, pairs, **kwargs):
+    if table in LINK_TABLES:
+        refresh_after_write()
@@ -0,0 +1,162 @@
+import time
+from collections import Counter, defaultdict
+from threading import RLock
+
+from flask import current_app
+from marshmallow import ValidationError
+from sqlalchemy import func, literal, select, union_all
+
+from api.models import db, film_actor, film_category, primary_reads
+from api.models.actor import Actor
+from api.models.category import Category
+from api.models.film import Film
+from api.signals import entities_changed, links_changed
+
+
+class CatalogueStats(object):
+    """
+    In memory summaries of the catalogue for the stats routes, kept up to date from the write signals. The links of
+    each film are held as sets, so a change that was already read or applied doesn't count twice. Only the writes of
+    its own process are applied, so the summaries are rebuilt on the first read once they're older than STATS_MAX_AGE
+    """
+
+    def __init__(self):
+        self._lock = RLock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.built = False
+            self.built_at = None
+            self.films = {}
+            self.film_categories = defaultdict(set)
+            self.film_actors = defaultdict(set)
+
+    def build(self):
+        """
+        Reads the films and the links of the association tables
+        """
+        with self._lock, primary_reads():
+            self.reset()
+            read_at = time.monotonic()
+            for film_id, release_year, length in db.session.execute(
+                    select(Film.film_id, Film.release_year, Film.length)):
+                self.films[film_id] = (release_year, length)
+            for category_id, film_id in db.session.execute(select(film_category.c.category_id,
+                                                                  film_category.c.film_id)):
+                self.film_categories[film_id].add(category_id)
+            for actor_id, film_id in db.session.execute(select(film_actor.c.actor_id, film_actor.c.film_id)):
+                self.film_actors[film_id].add(actor_id)
+            self.built = True
+            self.built_at = read_at
+
+    def ensure_built(self):
+        with self._lock:
+            max_age = current_app.config['STATS_MAX_AGE']
+            if not self.built or (max_age is not None and time.monotonic() - self.built_at > max_age):
+                self.build()
+
+    def films_per_category(self):
+        """
+        :return: The number of films in each category by category id
+        """
+        with self._lock:
+            self.ensure_built()
+            return Counter(category_id for categories in self.film_categories.values() for category_id in categories)
+
+    def cast_size_counts(self):
+        """
+        :return: The number of films with each number of actors, by number of actors
+        """
+        with self._lock:
+            self.ensure_built()
+            return Counter(len(self.film_actors.get(film_id, ())) for film_id in self.films)
+
+    def length_histogram(self, bucket):
+        """
+        :param bucket: The width of each length bucket
+        :return: The number of films in each length bucket by (release year, start of the bucket)
+        """
+        with self._lock:
+            self.ensure_built()
+            return Counter((release_year, length // bucket * bucket) for release_year, length in self.films.values())
+
+    def update_films(self, action, ids):
+        with self._lock:
+            if not self.built:
+                return
+            if action == 'delete':
+                for film_id in ids:
+                    self.films.pop(film_id, None)
+                    self.film_categories.pop(film_id, None)
+                    self.film_actors.pop(film_id, None)
+                return
+            for film_id, release_year, length in db.session.execute(
+                    select(Film.film_id, Film.release_year, Film.length).where(Film.film_id.in_(ids))):
+                self.films[film_id] = (release_year, length)
+
+    def update_links(self, table, action, pairs):
+        with self._lock:
+            if not self.built:
+                return
+            links = self.film_categories if table is film_category else self.film_actors
+            for linked_id, film_id in pairs:
+                if action == 'add':
+                    links[film_id].add(linked_id)
+                else:
+                    links[film_id].discard(linked_id)
+
+
+catalogue_stats = CatalogueStats()
+
+# The facets /api/films/ can count, as (column grouped by, how the column is joined to the films)
+FACETS = {
+    'category': film_category.c.category_id,
+    'release_year': Film.release_year
+}
+
+
+def init_app(app):
+    # The summaries are built from the database on the first read after startup
+    catalogue_stats.reset()
+
+
+def facet_counts(films, names):
+    """
+    Counts every requested facet of the films in one statement, as a UNION ALL of grouped queries
+    :param films: The filtered film entities
+    :param names: The names of the facets to count
+    :return: The number of films with each value of each facet, as {name: [{value, count},...]}
+    """
+    unknown = [name for name in names if name not in FACETS]
+    if unknown:
+        raise ValidationError({"facets": [f"Cannot count facet '{name}'" for name in unknown]})
+
+    film_ids = films.order_by(None).with_entities(Film.film_id).subquery()
+    queries = []
+    for name in names:
+        column = FACETS[name]
+        film_column = film_category.c.film_id if column.table is film_category else Film.film_id
+        queries.append(select(literal(name).label('facet'), column.label('value'), func.count().label('count'))
+                       .where(film_column.in_(select(film_ids.c.film_id))).group_by(column))
+
+    facets = {name: [] for name in names}
+    if queries:
+        for name, value, count in db.session.execute(union_all(*queries).order_by('facet', 'value')):
+            facets[name].append({"value": value, "count": count})
+    return facets
+
+
+@entities_changed.connect
+def update_stats_entities(model, action, ids, **kwargs):
+    if model is Film and ids is not None:
+        catalogue_stats.update_films(action, ids)
+    elif model is Film or (model in (Actor, Category) and action == 'delete'):
+        # Films with unknown ids, or an actor or category whose links spanned many films
+        catalogue_stats.reset()
+
+
+@links_changed.connect
+def update_stats_links(table, action, pairs, **kwargs):
+    if table is film_actor or table is film_category:
+        catalogue_stats.update_links(table, action, pairs)
@@ -1,14 +1,16 @@
 from flask import Flask
 
 from api.config import config
+from api.json import FastJSONProvider
 from api.routes import routes
 
 
 app = Flask(__name__)
 
-def create_app():
+def create_app(config_object=None):
     app = Flask(__name__)
-    app.config.from_object(config)
+    app.json = FastJSONProvider(app)
+    app.config.from_object(config_object or config)
 
     from api.models import db
     db.init_app(app)
@@ -16,12 +18,74 @@ def create_app():
     from api.schemas import ma
     ma.init_app(ma)
 
+    from api import counts
+    counts.init_app(app)
+
+    from api import search
+    search.init_app(app)
+
+    from api import response_cache
+    response_cache.init_app(app)
+
+    from api import graph
+    graph.init_app(app)
+
+    from api import similarity
+    similarity.init_app(app)
+
+    from api import stats
+    stats.init_app(app)
+
+    from api import snapshot
+    snapshot.init_app(app)
+
+    from api import compression
+    compression.init_app(app)
+
+    from api import admission
+    admission.init_app(app)
+
+    from api import group_commit
+    group_commit.init_app(app)
+
+    from api import metrics
+    metrics.init_app(app)
+
+    from api import slow_queries
+    slow_queries.init_app(app)
+
     app.register_blueprint(routes)
 
+    if app.config['ADMIN_ENABLED']:
+        from api.routes.admin import admin_router
+        app.register_blueprint(admin_router)
+
     return app
 
 
 
+def create_async_app(config_object=None):
+    """
+    :return: An ASGI app serving the read routes from an async engine, for many slow concurrent clients.
+    Needs Quart and an async driver for the database (aiomysql, asyncpg or aiosqlite)
+    """
+    try:
+        from quart import Quart
+    except ImportError as error:
+        raise RuntimeError("The async app needs Quart, install it with pip install quart") from error
+
+    app = Quart(__name__)
+    app.config.from_object(config_object or config)
+
+    from api import async_db
+    async_db.init_app(app)
+
+    from api.routes.async_routes import async_routes
+    app.register_blueprint(async_routes)
+
+    return app
+
+
 if __name__ == '__main__':
     app = create_app()
     app.run()
@@ -0,0 +1,92 @@
+import random
+
+from api.models import db, film_actor, film_category
+from api.models.actor import Actor
+from api.models.category import Category
+from api.models.film import Film
+from api.signals import entities_changed
+
+# The size of each table in the Sakila sample database, a scale of 1
+SAKILA_SIZES = {
+    'actor': 200,
+    'film': 1000,
+    'category': 16,
+    'film_actor': 5462,
+    'film_category': 1000
+}
+
+CATEGORY_NAMES = ['Action', 'Animation', 'Children', 'Classics', 'Comedy', 'Documentary', 'Drama', 'Family',
+                  'Foreign', 'Games', 'Horror', 'Music', 'New', 'Sci-Fi', 'Sports', 'Travel']
+
+FIRST_NAMES = ['PENELOPE', 'NICK', 'ED', 'JENNIFER', 'JOHNNY', 'BETTE', 'GRACE', 'MATTHEW', 'JOE', 'CHRISTIAN',
+               'ZERO', 'KARL', 'UMA', 'VIVIEN', 'CUBA', 'FRED', 'HELEN', 'DAN', 'BOB', 'LUCILLE']
+LAST_NAMES = ['GUINESS', 'WAHLBERG', 'CHASE', 'DAVIS', 'LOLLOBRIGIDA', 'NICHOLSON', 'MOSTEL', 'JOHANSSON', 'SWANK',
+              'GABLE', 'CAGE', 'BERRY', 'WOOD', 'BERGEN', 'OLIVIER', 'COSTNER', 'VOIGHT', 'TORN', 'FAWCETT', 'TRACY']
+TITLE_WORDS = ['ACADEMY', 'DINOSAUR', 'ACE', 'GOLDFINGER', 'ADAPTATION', 'HOLES', 'AFFAIR', 'PREJUDICE', 'AFRICAN',
+               'EGG', 'AGENT', 'TRUMAN', 'AIRPLANE', 'SIERRA', 'ALABAMA', 'DEVIL', 'ALADDIN', 'CALENDAR', 'ALAMO',
+               'VIDEOTAPE', 'ALASKA', 'PHANTOM', 'ALI', 'FOREVER', 'ALONE', 'TRIP', 'AMADEUS', 'HOLY', 'AMELIE', 'HELLFIGHTERS']
+DESCRIPTION_WORDS = ['Epic', 'Drama', 'Feminist', 'Mad', 'Scientist', 'Boat', 'Astounding', 'Reflection', 'Database',
+                     'Administrator', 'Lumberjack', 'Ancient', 'China', 'Dentist', 'Crocodile', 'Shark', 'Canadian',
+                     'Rockies', 'Mysql', 'Convention', 'Monastery', 'Explorer', 'Documentary', 'Sumo', 'Wrestler']
+
+
+def table_sizes(scale):
+    """
+    :param scale: The size of the data set as a multiple of Sakila, categories stay at the Sakila size
+    :return: The number of rows to generate for each table
+    """
+    sizes = {name: max(1, round(size * scale)) for name, size in SAKILA_SIZES.items()}
+    sizes['category'] = SAKILA_SIZES['category']
+    return sizes
+
+
+def chunks(rows, size):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def generate(scale=1, seed=0, chunk_size=10000):
+    """
+    Creates the schema in the app's database and fills it with the same synthetic data for the same scale and seed,
+    must be run in an app context
+    :param scale: The size of the data set as a multiple of Sakila
+    :param seed: The seed of the random data
+    :param chunk_size: The number of rows inserted by each statement
+    :return: The number of rows generated for each table
+    """
+    rng = random.Random(seed)
+    sizes = table_sizes(scale)
+
+    db.drop_all()
+    db.create_all()
+
+    actors = [{"actor_id": actor_id, "first_name": rng.choice(FIRST_NAMES), "last_name": rng.choice(LAST_NAMES)}
+              for actor_id in range(1, sizes['actor'] + 1)]
+    films = [{"film_id": film_id,
+              "title": f"{rng.choice(TITLE_WORDS)} {rng.choice(TITLE_WORDS)} {film_id}",
+              "description": f"A {' '.join(rng.sample(DESCRIPTION_WORDS, 6))}",
+              "release_year": rng.randint(1990, 2020),
+              "length": rng.randint(46, 185)}
+             for film_id in range(1, sizes['film'] + 1)]
+    categories = [{"category_id": category_id, "name": name}
+                  for category_id, name in enumerate(CATEGORY_NAMES[:sizes['category']], start=1)]
+
+    # Every film has one category like Sakila, and the cast links are spread at random without duplicates
+    film_categories = [{"category_id": rng.randint(1, sizes['category']), "film_id": film_id}
+                       for film_id in range(1, sizes['film'] + 1)]
+    cast = set()
+    while len(cast) < min(sizes['film_actor'], sizes['actor'] * sizes['film']):
+        cast.add((rng.randint(1, sizes['actor']), rng.randint(1, sizes['film'])))
+    film_actors = [{"actor_id": actor_id, "film_id": film_id} for actor_id, film_id in sorted(cast)]
+
+    for table, rows in ((Actor.__table__, actors), (Film.__table__, films), (Category.__table__, categories),
+                        (film_actor, film_actors), (film_category, film_categories)):
+        for chunk in chunks(rows, chunk_size):
+            db.session.execute(table.insert(), chunk)
+    db.session.commit()
+    # The rows are inserted around the routes, so the in memory indexes of the app are rebuilt from the new tables
+    for model in (Actor, Film, Category):
+        entities_changed.send(model, action='create', ids=None)
+
+    return {"actor": len(actors), "film": len(films), "category": len(categories),
+            "film_actor": len(film_actors), "film_category": len(film_categories)}
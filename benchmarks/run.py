@@ -0,0 +1,240 @@
+"""
+Benchmarks every route in api/routes against a synthetic Sakila data set in SQLite and reports latency percentiles,
+throughput and queries per request as JSON.
+
+    python -m benchmarks.run --scale 10 --threads 8 --output report.json
+    python -m benchmarks.run --scale 10 --baseline report.json
+
+With --baseline the run exits with status 1 when an endpoint's p95 latency grew by more than the tolerance, or it
+runs more queries per request than it did in the baseline.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from sqlalchemy import event
+
+from api.config import Config
+from api.models import db
+from app import create_app
+from benchmarks.dataset import generate
+from benchmarks.scenarios import SCENARIOS
+
+
+class BenchmarkConfig(Config):
+    TESTING = True
+    # Nothing is written outside the benchmark's database
+    SLOW_QUERY_LOG_FILE = None
+
+
+class Recorder(object):
+    """
+    Collects the latency, statement count and status of every request, by endpoint
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}
+
+    def record(self, endpoint, latency, statements, status):
+        with self._lock:
+            self.samples.setdefault(endpoint, []).append((latency, statements, status))
+
+
+def percentile(values, fraction):
+    """
+    :param values: Sorted values
+    :param fraction: The fraction of values at or below the percentile, between 0 and 1
+    :return: The nearest rank percentile of the values
+    """
+    return values[max(0, min(len(values) - 1, round(fraction * len(values) + 0.5) - 1))]
+
+
+def summarize(samples):
+    latencies = sorted(latency for latency, _, _ in samples)
+    return {
+        "requests": len(samples),
+        "errors": sum(1 for _, _, status in samples if status >= 400),
+        "latency": {
+            "p50": percentile(latencies, 0.50),
+            "p95": percentile(latencies, 0.95),
+            "p99": percentile(latencies, 0.99),
+            "mean": sum(latencies) / len(latencies)
+        },
+        "queries_per_request": sum(statements for _, statements, _ in samples) / len(samples)
+    }
+
+
+def run_scenarios(app, names, sizes, iterations, seed, recorder, statements):
+    """
+    Runs the scenarios in turn with one test client, the given number of times
+    """
+    client = app.test_client()
+    adapter = app.url_map.bind('localhost')
+    rng = random.Random(seed)
+    for _ in range(iterations):
+        for name in names:
+            scenario = SCENARIOS[name](rng, sizes)
+            response = None
+            while True:
+                try:
+                    method, path, body = scenario.send(response)
+                except StopIteration:
+                    break
+
+                statements.count = 0
+                start = time.perf_counter()
+                response = client.open(path, method=method, json=body)
+                # Streamed responses are only done once their body has been read
+                response.get_data()
+                latency = time.perf_counter() - start
+
+                endpoint, _ = adapter.match(path.split('?')[0], method)
+                recorder.record(endpoint, latency, statements.count, response.status_code)
+
+
+def run_phase(app, names, sizes, threads, iterations, seed):
+    """
+    :return: The summary of running the scenarios on the given number of threads at once, overall and by endpoint
+    """
+    recorder = Recorder()
+    statements = threading.local()
+
+    @event.listens_for(db.engine, 'after_cursor_execute')
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.count = getattr(statements, 'count', 0) + 1
+
+    workers = [threading.Thread(target=run_scenarios,
+                                args=(app, names, sizes, iterations, seed + worker, recorder, statements))
+               for worker in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    duration = time.perf_counter() - start
+    event.remove(db.engine, 'after_cursor_execute', count_statement)
+
+    samples = [sample for endpoint_samples in recorder.samples.values() for sample in endpoint_samples]
+    return {
+        "threads": threads,
+        "duration": duration,
+        "throughput": len(samples) / duration,
+        **summarize(samples),
+        "endpoints": {endpoint: summarize(endpoint_samples)
+                      for endpoint, endpoint_samples in sorted(recorder.samples.items())}
+    }
+
+
+def compare(report, baseline, tolerance):
+    """
+    :return: A description of each endpoint that got slower or runs more queries than in the baseline
+    """
+    regressions = []
+    for phase, summary in report["phases"].items():
+        baseline_endpoints = baseline.get("phases", {}).get(phase, {}).get("endpoints", {})
+        for endpoint, current in summary["endpoints"].items():
+            previous = baseline_endpoints.get(endpoint)
+            if previous is None:
+                continue
+            if current["latency"]["p95"] > previous["latency"]["p95"] * (1 + tolerance):
+                regressions.append(f"{phase} {endpoint}: p95 {previous['latency']['p95'] * 1000:.2f}ms -> "
+                                   f"{current['latency']['p95'] * 1000:.2f}ms")
+            if current["queries_per_request"] > previous["queries_per_request"]:
+                regressions.append(f"{phase} {endpoint}: {previous['queries_per_request']:.2f} -> "
+                                   f"{current['queries_per_request']:.2f} queries per request")
+    return regressions
+
+
+def config_value(value):
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Benchmark the API against a synthetic Sakila data set")
+    parser.add_argument('--scale', type=float, default=1, help="size of the data set as a multiple of Sakila")
+    parser.add_argument('--database', help="SQLAlchemy URL of the database, a temporary SQLite file by default")
+    parser.add_argument('--threads', type=int, default=4, help="threads of the concurrent phase")
+    parser.add_argument('--iterations', type=int, default=5, help="runs of every scenario by each thread")
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help="comma separated scenarios to run")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the data set and the requests")
+    parser.add_argument('--set', action='append', default=[], metavar='KEY=VALUE',
+                        help="override an app config value, values are read as JSON when they can be")
+    parser.add_argument('--output', help="file to write the report to, stdout by default")
+    parser.add_argument('--baseline', help="report of an earlier run to check for regressions against")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed growth of p95 latency")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    names = [name for name in args.scenarios.split(',') if name]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        sys.exit(f"Unknown scenarios: {', '.join(unknown)}")
+
+    database = args.database
+    if database is None:
+        database = f"sqlite:///{os.path.join(tempfile.gettempdir(), f'sakila-benchmark-{args.scale:g}x.db')}"
+    overrides = {key: config_value(value) for key, value in (setting.split('=', 1) for setting in args.set)}
+
+    config = type('Config', (BenchmarkConfig,), {
+        "SQLALCHEMY_DATABASE_URI": database,
+        # Waiting on the lock of an SQLite file rather than failing lets the writes of the concurrent phase queue up
+        "SQLALCHEMY_ENGINE_OPTIONS": {"connect_args": {"timeout": 30}} if database.startswith('sqlite') else {},
+        **overrides
+    })
+    app = create_app(config)
+
+    with app.app_context():
+        generation_start = time.perf_counter()
+        sizes = generate(args.scale, args.seed)
+        generation = time.perf_counter() - generation_start
+
+        report = {
+            "scale": args.scale,
+            "seed": args.seed,
+            "database": db.engine.url.render_as_string(hide_password=True),
+            "python": platform.python_version(),
+            "config": overrides,
+            "scenarios": names,
+            "rows": sizes,
+            "generation_duration": generation,
+            "phases": {
+                "sequential": run_phase(app, names, sizes, 1, args.iterations, args.seed),
+                "concurrent": run_phase(app, names, sizes, args.threads, args.iterations, args.seed)
+            }
+        }
+
+    # Routes none of the scenarios reached, so gaps in the benchmark show up in the report
+    covered = {endpoint for summary in report["phases"].values() for endpoint in summary["endpoints"]}
+    report["uncovered"] = sorted({rule.endpoint for rule in app.url_map.iter_rules()
+                                  if rule.rule.startswith('/api/')} - covered)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as report_file:
+            report_file.write(output + '\n')
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare(report, json.load(baseline_file), args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""
+The workloads the benchmark runs. Each scenario is a generator that yields (method, path, json) requests and is sent
+the response to each one, so writes can follow the entities they create. Write scenarios clean up after themselves,
+so the data set keeps its size however long the benchmark runs.
+"""
+
+# Words that appear in the generated titles, names and descriptions, see benchmarks.dataset
+TITLE_SEARCHES = ['ACADEMY', 'DINOSAUR', 'ALIEN', 'HOLES', 'TRIP']
+NAME_SEARCHES = ['PENELOPE', 'NICK', 'GUINESS', 'CAGE']
+
+
+def film(rng):
+    return {"title": f"BENCHMARK {rng.randint(1, 10 ** 6)}", "description": "A Benchmark of a Database",
+            "release_year": rng.randint(1990, 2020), "length": rng.randint(46, 185)}
+
+
+def actor(rng):
+    return {"first_name": "BENCH", "last_name": f"MARK{rng.randint(1, 10 ** 6)}"}
+
+
+def ids(rng, size, count):
+    return rng.sample(range(1, size + 1), min(count, size))
+
+
+def films_reads(rng, sizes):
+    film_id = rng.randint(1, sizes['film'])
+    yield 'GET', f"/api/films/?page={rng.randint(1, max(1, sizes['film'] // 10))}", None
+    yield 'GET', f"/api/films/?title={rng.choice(TITLE_SEARCHES)}&count=estimate", None
+    yield 'GET', "/api/films/?facets=category,release_year&per_page=5", None
+    yield 'GET', "/api/films/?sort=length&per_page=50&cursor=", None
+    yield 'GET', f"/api/films/?ids={','.join(map(str, ids(rng, sizes['film'], 20)))}", None
+    yield 'GET', f"/api/films/{film_id}", None
+    yield 'GET', f"/api/films/{film_id}?include=actors,categories&fields=film_id,title", None
+    yield 'GET', f"/api/films/{film_id}/actors", None
+    yield 'GET', f"/api/films/{film_id}/categories", None
+    yield 'GET', f"/api/films/{film_id}/similar?top=10", None
+    yield 'GET', f"/api/films/export?title={rng.choice(TITLE_SEARCHES)}", None
+
+
+def actors_reads(rng, sizes):
+    actor_id, other_id = rng.randint(1, sizes['actor']), rng.randint(1, sizes['actor'])
+    yield 'GET', f"/api/actors/?page={rng.randint(1, max(1, sizes['actor'] // 10))}", None
+    yield 'GET', f"/api/actors/?first_name={rng.choice(NAME_SEARCHES)}", None
+    yield 'GET', f"/api/actors/{actor_id}", None
+    yield 'GET', f"/api/actors/{actor_id}/films", None
+    yield 'GET', f"/api/actors/{actor_id}/costars?top=10", None
+    yield 'GET', f"/api/actors/{actor_id}/path/{other_id}", None
+    yield 'GET', f"/api/actors/export?last_name={rng.choice(NAME_SEARCHES)}&format=csv", None
+
+
+def categories_reads(rng, sizes):
+    category_id = rng.randint(1, sizes['category'])
+    yield 'GET', "/api/categories/", None
+    yield 'GET', f"/api/categories/{category_id}", None
+    yield 'GET', f"/api/categories/{category_id}/films?per_page=25", None
+    yield 'GET', "/api/categories/export", None
+
+
+def stats_reads(rng, sizes):
+    yield 'GET', "/api/stats/films-per-category", None
+    yield 'GET', "/api/stats/cast-sizes", None
+    yield 'GET', "/api/stats/lengths?bucket=30", None
+
+
+def batch_reads(rng, sizes):
+    yield 'POST', "/api/batch/", {"requests": [f"/api/films/{film_id}" for film_id in ids(rng, sizes['film'], 5)]}
+
+
+def film_writes(rng, sizes):
+    film_id = (yield 'POST', "/api/films/", film(rng)).json['film_id']
+    actor_ids = ids(rng, sizes['actor'], 5)
+    category_id = rng.randint(1, sizes['category'])
+    yield 'PUT', f"/api/films/{film_id}", film(rng)
+    yield 'PATCH', f"/api/films/{film_id}", {"length": rng.randint(46, 185)}
+    yield 'PATCH', f"/api/films/{film_id}/actors", {"ids": actor_ids[1:]}
+    yield 'DELETE', f"/api/films/{film_id}/actors", {"ids": actor_ids[1:]}
+    yield 'PATCH', f"/api/films/{film_id}/actors/{actor_ids[0]}", None
+    yield 'GET', f"/api/films/{film_id}/actors/{actor_ids[0]}", None
+    yield 'DELETE', f"/api/films/{film_id}/actors/{actor_ids[0]}", None
+    yield 'PATCH', f"/api/films/{film_id}/categories", {"ids": [category_id]}
+    yield 'DELETE', f"/api/films/{film_id}/categories", {"ids": [category_id]}
+    yield 'PATCH', f"/api/films/{film_id}/categories/{category_id}", None
+    yield 'GET', f"/api/films/{film_id}/categories/{category_id}", None
+    yield 'DELETE', f"/api/films/{film_id}/categories/{category_id}", None
+    yield 'DELETE', f"/api/films/{film_id}", None
+
+
+def actor_writes(rng, sizes):
+    actor_id = (yield 'POST', "/api/actors/", actor(rng)).json['actor_id']
+    film_ids = ids(rng, sizes['film'], 5)
+    yield 'PUT', f"/api/actors/{actor_id}", actor(rng)
+    yield 'PATCH', f"/api/actors/{actor_id}", {"first_name": "BENCHED"}
+    yield 'PATCH', f"/api/actors/{actor_id}/films", {"ids": film_ids[1:]}
+    yield 'DELETE', f"/api/actors/{actor_id}/films", {"ids": film_ids[1:]}
+    yield 'PATCH', f"/api/actors/{actor_id}/films/{film_ids[0]}", None
+    yield 'GET', f"/api/actors/{actor_id}/films/{film_ids[0]}", None
+    yield 'DELETE', f"/api/actors/{actor_id}/films/{film_ids[0]}", None
+    yield 'DELETE', f"/api/actors/{actor_id}", None
+
+
+def category_writes(rng, sizes):
+    category_id = (yield 'POST', "/api/categories/", {"name": "Benchmark"}).json['category_id']
+    film_ids = ids(rng, sizes['film'], 5)
+    yield 'PUT', f"/api/categories/{category_id}", {"name": "Benchmarked"}
+    yield 'PATCH', f"/api/categories/{category_id}", {"name": "Benchmarking"}
+    yield 'PATCH', f"/api/categories/{category_id}/films", {"ids": film_ids[1:]}
+    yield 'DELETE', f"/api/categories/{category_id}/films", {"ids": film_ids[1:]}
+    yield 'PATCH', f"/api/categories/{category_id}/films/{film_ids[0]}", None
+    yield 'DELETE', f"/api/categories/{category_id}/films/{film_ids[0]}", None
+    yield 'DELETE', f"/api/categories/{category_id}", None
+
+
+def bulk_writes(rng, sizes):
+    for resource, item, key in (("actors", actor, 'actor_id'), ("films", film, 'film_id'),
+                                ("categories", lambda rng: {"name": "Bulk"}, 'category_id')):
+        created = (yield 'POST', f"/api/{resource}/bulk", [item(rng) for _ in range(10)]).json['data']
+        for result in created:
+            yield 'DELETE', f"/api/{resource}/{result['data'][key]}", None
+
+
+SCENARIOS = {
+    'films_reads': films_reads,
+    'actors_reads': actors_reads,
+    'categories_reads': categories_reads,
+    'stats_reads': stats_reads,
+    'batch_reads': batch_reads,
+    'film_writes': film_writes,
+    'actor_writes': actor_writes,
+    'category_writes': category_writes,
+    'bulk_writes': bulk_writes
+}
@@ -0,0 +1,96 @@
+"""
+Smoke test of the async app: its read routes must answer like the sync app's over the same SQLite database.
+
+    python -m pytest tests
+"""
+import asyncio
+
+import pytest
+
+pytest.importorskip('quart')
+pytest.importorskip('aiosqlite')
+
+from api.config import Config
+from api.models import db, film_actor, film_category
+from api.models.actor import Actor
+from api.models.category import Category
+from api.models.film import Film
+from api.signals import entities_changed
+from app import create_app, create_async_app
+
+SAME_RESPONSE_URLS = [
+    '/api/films/',
+    '/api/films/?title=FILM 1&per_page=3&page=2',
+    '/api/films/?count=none&fields=film_id,title',
+    '/api/films/1',
+    '/api/films/1?include=actors,categories&fields=film_id,title',
+    '/api/films/1/actors',
+    '/api/films/1/actors/2',
+    '/api/films/1/categories',
+    '/api/films/1/categories/2',
+    '/api/films/999',
+    '/api/actors/',
+    '/api/actors/?first_name=FIRST1',
+    '/api/actors/2',
+    '/api/actors/2/films',
+    '/api/actors/2/films/1',
+    '/api/categories/',
+    '/api/categories/2',
+    '/api/categories/2/films?per_page=5'
+]
+
+UNSUPPORTED_URLS = [
+    '/api/films/?cursor=',
+    '/api/films/?ids=1,2',
+    '/api/films/?count=estimate',
+    '/api/films/?facets=category'
+]
+
+
+@pytest.fixture(scope='module')
+def apps(tmp_path_factory):
+    path = tmp_path_factory.mktemp('async') / 'sakila.db'
+
+    class TestConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{path}'
+        SLOW_QUERY_LOG_FILE = None
+
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([Actor(actor_id=i, first_name=f'FIRST{i}', last_name=f'LAST{i % 7}') for i in range(1, 31)])
+        db.session.add_all([Film(film_id=i, title=f'FILM {i}', description=f'A Story of {i}', release_year=2000 + i % 5,
+                                 length=60 + i) for i in range(1, 51)])
+        db.session.add_all([Category(category_id=i, name=f'CATEGORY {i}') for i in range(1, 6)])
+        db.session.flush()
+        db.session.execute(film_actor.insert(), [{"actor_id": film_id % 30 + 1, "film_id": film_id}
+                                                 for film_id in range(1, 51)])
+        db.session.execute(film_category.insert(), [{"category_id": film_id % 5 + 1, "film_id": film_id}
+                                                    for film_id in range(1, 51)])
+        db.session.commit()
+        for model in (Actor, Film, Category):
+            entities_changed.send(model, action='create', ids=None)
+    return app, create_async_app(TestConfig)
+
+
+def async_get(async_app, url):
+    async def get():
+        response = await async_app.test_client().get(url)
+        return response.status_code, await response.get_json()
+    return asyncio.run(get())
+
+
+@pytest.mark.parametrize('url', SAME_RESPONSE_URLS)
+def test_same_response_as_sync_app(apps, url):
+    app, async_app = apps
+    response = app.test_client().get(url)
+    assert async_get(async_app, url) == (response.status_code, response.get_json())
+
+
+@pytest.mark.parametrize('url', UNSUPPORTED_URLS)
+def test_unsupported_args_are_rejected(apps, url):
+    _, async_app = apps
+    status, body = async_get(async_app, url)
+    assert status == 400
+    assert body["error_type"] == "validation_error"